@@ -1,5 +1,5 @@
-from keras.layers import Bidirectional, Concatenate, Dot, Input, LSTM
-from keras.layers import RepeatVector, Dense, Activation
+from keras.layers import Bidirectional, Add, Dot, Input, LSTM
+from keras.layers import RepeatVector, Dense, Activation, Embedding
 from keras.optimizers import Adam
 from keras.models import Model
 from nmt_utils import *
@@ -8,43 +8,59 @@ import json
 print('loaded and locked')
 
 m = 100000
-dataset, human_vocab, machine_vocab, inv_machine_vocab = load_dataset(m)
+Tx = int(30)
+Ty = int(10)
+# e.g. ['en_US', 'fr_FR', 'de_DE'] to train on dates formatted in several languages, None for LOCALES
+locales = None
+# X and Y are memory-mapped from ./dataset_cache and only regenerated when m, the seed, FORMATS, the locales, Tx or Ty change
+X, Y, human_vocab, machine_vocab, inv_machine_vocab = load_cached_dataset(m, Tx, Ty, locales=locales)
 
 print(len(human_vocab), len(machine_vocab), len(inv_machine_vocab))
 
 with open('human_vocab.json', 'w') as f:
     json.dump(human_vocab, f)
+with open('machine_vocab.json', 'w') as f:
+    json.dump(machine_vocab, f)
+with open('inv_machine_vocab.json', 'w') as f:
+    json.dump(inv_machine_vocab, f)
 
-print(dataset[:10])
 # PREPROCESS
-Tx = int(30)
-Ty = int(10)
-X, Y, Xoh, Yoh = preprocess_data(dataset, human_vocab, machine_vocab, Tx, Ty)
+# set to e.g. 32 to feed the model int indices through an Embedding layer instead of (m, Tx, V) one-hot tensors
+embedding_dim = None
+if embedding_dim is None:
+    Xoh = to_one_hot(X, len(human_vocab))
+    Yoh = to_one_hot(Y, len(machine_vocab))
 print("X.shape:", X.shape)
 print("Y.shape:", Y.shape)
-print("Xoh.shape:", Xoh.shape)
-print("Yoh.shape:", Yoh.shape)
+if embedding_dim is None:
+    print("Xoh.shape:", Xoh.shape)
+    print("Yoh.shape:", Yoh.shape)
 # DATA INSIGHT
 index = 0
-print("Source date:", dataset[index][0])
-print("Target date:", dataset[index][1])
+inv_human_vocab = {v: k for k, v in human_vocab.items()}
+print("Source date:", ''.join(int_to_string(X[index], inv_human_vocab)).replace('<pad>', ''))
+print("Target date:", ''.join(int_to_string(Y[index], inv_machine_vocab)))
 print()
 print("Source after preprocessing (indices):", X[index])
 print("Target after preprocessing (indices):", Y[index])
 print()
-print("Source after preprocessing (one-hot):", Xoh[index])
-print("Target after preprocessing (one-hot):", Yoh[index])
+if embedding_dim is None:
+    print("Source after preprocessing (one-hot):", Xoh[index])
+    print("Target after preprocessing (one-hot):", Yoh[index])
 #
+n_a = 64
+n_s = 128
 # Defined shared layers as global variables
 repeator = RepeatVector(Tx)
-concatenator = Concatenate(axis=-1)
-densor1 = Dense(10, activation = "tanh")
+adder = Add()
+densor1 = SplitDense(10, encoder_dim=2*n_a, decoder_dim=n_s)
+tanh_activator = Activation("tanh")
 densor2 = Dense(1, activation = "relu")
 activator = Activation(softmax, name='attention_weights') # a custom softmax(axis = 1)
 dotor = Dot(axes = 1)
 
 
-def one_step_attention(a, s_prev):
+def one_step_attention(a, s_prev, a_proj):
     """
     Performs one step of attention: Outputs a context vector computed as a dot product of the attention weights
     "alphas" and the hidden states "a" of the Bi-LSTM.
@@ -52,17 +68,17 @@ def one_step_attention(a, s_prev):
     Arguments:
     a -- hidden state output of the Bi-LSTM, numpy-array of shape (m, Tx, 2*n_a)
     s_prev -- previous hidden state of the (post-attention) LSTM, numpy-array of shape (m, n_s)
+    a_proj -- densor1(a), the encoder half of densor1 computed once per sequence, numpy-array of shape (m, Tx, 10)
 
     Returns:
     context -- context vector, input of the next (post-attetion) LSTM cell
     """
 
-    # Use repeator to repeat s_prev to be of shape (m, Tx, n_s) so that you can concatenate it with all hidden states "a"
-    s_prev = repeator(s_prev)
-    # Use concatenator to concatenate a and s_prev on the last axis
-    concat = concatenator([a, s_prev])
-    # Use densor1 to propagate concat through a small fully-connected neural network to compute the "intermediate energies" variable e.
-    e = densor1(concat)
+    # Use densor1 to project s_prev with the decoder half of its kernel, then repeator to repeat it to shape (m, Tx, 10)
+    s_proj = repeator(densor1(s_prev))
+    # Add the precomputed projection of "a" and apply tanh to compute the "intermediate energies" variable e.
+    # (equivalent to the Dense layer on the concatenation of a and s_prev)
+    e = tanh_activator(adder([a_proj, s_proj]))
     # Use densor2 to propagate e through a small fully-connected neural network to compute the "energies" variable energies.
     energies = densor2(e)
     # Use "activator" on "energies" to compute the attention weights "alphas"
@@ -72,13 +88,11 @@ def one_step_attention(a, s_prev):
 
     return context
 
-n_a = 64
-n_s = 128
 post_activation_LSTM_cell = LSTM(n_s, return_state=True)
 output_layer = Dense(len(machine_vocab), activation=softmax)
 
 
-def model(Tx, Ty, n_a, n_s, human_vocab_size, machine_vocab_size):
+def model(Tx, Ty, n_a, n_s, human_vocab_size, machine_vocab_size, embedding_dim=None):
     """
     Arguments:
     Tx -- length of the input sequence
@@ -87,6 +101,8 @@ def model(Tx, Ty, n_a, n_s, human_vocab_size, machine_vocab_size):
     n_s -- hidden state size of the post-attention LSTM
     human_vocab_size -- size of the python dictionary "human_vocab"
     machine_vocab_size -- size of the python dictionary "machine_vocab"
+    embedding_dim -- if set, the model takes int indices of shape (Tx,) and embeds them in embedding_dim
+                     dimensions instead of taking one-hot vectors of shape (Tx, human_vocab_size)
 
     Returns:
     model -- Keras model instance
@@ -94,7 +110,12 @@ def model(Tx, Ty, n_a, n_s, human_vocab_size, machine_vocab_size):
 
     # the inputs of model : shape (Tx,)
     # s0 and c0, initial hidden state for the decoder LSTM of shape (n_s,)
-    X = Input(shape=(Tx, human_vocab_size))
+    if embedding_dim is None:
+        X = Input(shape=(Tx, human_vocab_size))
+        x = X
+    else:
+        X = Input(shape=(Tx,), dtype='int32')
+        x = Embedding(human_vocab_size, embedding_dim, input_length=Tx)(X)
     s0 = Input(shape=(n_s,), name='s0')
     c0 = Input(shape=(n_s,), name='c0')
     s = s0
@@ -104,12 +125,14 @@ def model(Tx, Ty, n_a, n_s, human_vocab_size, machine_vocab_size):
     outputs = []
 
     # pre-attention Bi-LSTM definiton
-    a = Bidirectional(LSTM(units=n_a, input_shape=X.shape, return_sequences=True))(X)
+    a = Bidirectional(LSTM(units=n_a, return_sequences=True))(x)
+    # encoder half of the attention's densor1, the same for all Ty steps
+    a_proj = densor1(a)
 
     # Iterate for Ty steps
     for t in range(Ty):
         # Perform one step of the attention mechanism to get back the context vector at step t
-        context = one_step_attention(a, s)
+        context = one_step_attention(a, s, a_proj)
 
         # Step 2.B: Apply the post-attention LSTM cell to the "context" vector.
         # Don't forget to pass: initial_state = [hidden state, cell state]
@@ -128,31 +151,42 @@ def model(Tx, Ty, n_a, n_s, human_vocab_size, machine_vocab_size):
     return model
 
 
-model = model(Tx, Ty, n_a, n_s, len(human_vocab), len(machine_vocab))
+model = model(Tx, Ty, n_a, n_s, len(human_vocab), len(machine_vocab), embedding_dim)
 
 model.summary()
 
 opt = Adam(lr=0.005, beta_1=.9, beta_2=.999, decay=0.01)
-model.compile(loss='categorical_crossentropy', optimizer=opt, metrics=['accuracy'])
-
-s0 = np.zeros((m, n_s))
-c0 = np.zeros((m, n_s))
-outputs = list(Yoh.swapaxes(0, 1))
-
-model.fit([Xoh, s0, c0], outputs, epochs=500, batch_size=5000)
+s0 = np.zeros((len(X), n_s), dtype=np.float32)
+c0 = np.zeros((len(X), n_s), dtype=np.float32)
+if embedding_dim is None:
+    model.compile(loss='categorical_crossentropy', optimizer=opt, metrics=['accuracy'])
+    source = Xoh
+    outputs = list(Yoh.swapaxes(0, 1))
+else:
+    # integer targets of shape (m, 1) per output step, no (m, Ty, V) one-hot tensor
+    model.compile(loss='sparse_categorical_crossentropy', optimizer=opt, metrics=['accuracy'])
+    source = X
+    outputs = list(Y.T[..., np.newaxis])
+
+# set to e.g. 20 to train on fresh batches streamed from DateSequence instead of the fixed dataset above
+steps_per_epoch = None
+# per-epoch wall time, samples/sec, data vs compute time and peak RSS, one JSON line per epoch
+throughput = ThroughputLogger('training_stats.jsonl', batch_size=5000, n_a=n_a, n_s=n_s,
+                              input='one-hot' if embedding_dim is None else 'index',
+                              data='fixed' if steps_per_epoch is None else 'stream')
+if steps_per_epoch is None:
+    model.fit([source, s0, c0], outputs, epochs=500, batch_size=5000, callbacks=[throughput])
+else:
+    stream = DateSequence(human_vocab, machine_vocab, Tx, Ty, n_s, batch_size=5000, steps_per_epoch=steps_per_epoch,
+                          one_hot=embedding_dim is None, locales=locales)
+    model.fit_generator(stream, epochs=500, workers=4, use_multiprocessing=True, max_queue_size=8,
+                        callbacks=[throughput])
 
 EXAMPLES = ['1st May 1979', '5 April 09', '21st of August 2016', 'Tue 10 Jul 2007', 'Saturday May 9 2018',
             'March 3 2001', 'March 3rd 2001', '1 March 2001']
-for example in EXAMPLES:
-    source = string_to_int(example, Tx, human_vocab)
-    source = np.array(list(map(lambda x: to_categorical(x, num_classes=len(human_vocab)), source)))
-    source = np.expand_dims(source, axis=0)
-    prediction = model.predict([source, s0, c0])
-    prediction = np.argmax(prediction, axis=-1)
-    output = [inv_machine_vocab[int(i)] for i in prediction]
-
+for example, output in zip(EXAMPLES, parse_dates(model, EXAMPLES, human_vocab, inv_machine_vocab, Tx, n_s)):
     print("source:", example)
-    print("output:", ''.join(output))
+    print("output:", output)
 
 model_yaml = model.to_yaml()
 with open("model.yaml", "w") as yaml_file:
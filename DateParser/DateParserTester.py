@@ -1,8 +1,10 @@
-from keras.layers import Bidirectional, Concatenate, Dot, Input, LSTM
+from keras.layers import Bidirectional, Add, Dot, Input, LSTM
 from keras.layers import RepeatVector, Dense, Activation
 from keras.models import Model
 from nmt_utils import *
 import json
+import time
+import multiprocessing
 from nmt_utils import format_date_x
 import dateparser
 
@@ -12,16 +14,19 @@ inv_machine_vocab = json.loads(open('inv_machine_vocab.json').read())
 
 Tx = int(30)
 Ty = int(10)
+n_a = 64
+n_s = 128
 
 repeator = RepeatVector(Tx)
-concatenator = Concatenate(axis=-1)
-densor1 = Dense(10, activation = "tanh")
+adder = Add()
+densor1 = SplitDense(10, encoder_dim=2*n_a, decoder_dim=n_s)
+tanh_activator = Activation("tanh")
 densor2 = Dense(1, activation = "relu")
 activator = Activation(softmax, name='attention_weights') # custom softmax
 dotor = Dot(axes = 1)
 
 
-def one_step_attention(a, s_prev):
+def one_step_attention(a, s_prev, a_proj):
     """
     Performs one step of attention: Outputs a context vector computed as a dot product of the attention weights
     "alphas" and the hidden states "a" of the Bi-LSTM.
@@ -29,17 +34,17 @@ def one_step_attention(a, s_prev):
     Arguments:
     a -- hidden state output of the Bi-LSTM, numpy-array of shape (m, Tx, 2*n_a)
     s_prev -- previous hidden state of the (post-attention) LSTM, numpy-array of shape (m, n_s)
+    a_proj -- densor1(a), the encoder half of densor1 computed once per sequence, numpy-array of shape (m, Tx, 10)
 
     Returns:
     context -- context vector, input of the next (post-attetion) LSTM cell
     """
 
-    # Use repeator to repeat s_prev to be of shape (m, Tx, n_s) so that you can concatenate it with all hidden states "a"
-    s_prev = repeator(s_prev)
-    # Use concatenator to concatenate a and s_prev on the last axis
-    concat = concatenator([a, s_prev])
-    # Use densor1 to propagate concat through a small fully-connected neural network to compute the "intermediate energies" variable e.
-    e = densor1(concat)
+    # Use densor1 to project s_prev with the decoder half of its kernel, then repeator to repeat it to shape (m, Tx, 10)
+    s_proj = repeator(densor1(s_prev))
+    # Add the precomputed projection of "a" and apply tanh to compute the "intermediate energies" variable e.
+    # (equivalent to the Dense layer on the concatenation of a and s_prev)
+    e = tanh_activator(adder([a_proj, s_proj]))
     # Use densor2 to propagate e through a small fully-connected neural network to compute the "energies" variable energies.
     energies = densor2(e)
     # Use "activator" on "energies" to compute the attention weights "alphas"
@@ -48,8 +53,6 @@ def one_step_attention(a, s_prev):
     context = dotor([alphas, a])
     return context
 
-n_a = 64
-n_s = 128
 post_activation_LSTM_cell = LSTM(n_s, return_state=True)
 output_layer = Dense(len(machine_vocab), activation=softmax)
 
@@ -81,11 +84,13 @@ def model(Tx, Ty, n_a, n_s, human_vocab_size, machine_vocab_size):
 
     # pre-attention Bi-LSTM.
     a = Bidirectional(LSTM(units=n_a, input_shape=X.shape, return_sequences=True))(X)
+    # encoder half of the attention's densor1, the same for all Ty steps
+    a_proj = densor1(a)
 
     # Iterate for Ty steps
     for t in range(Ty):
         # one step of the attention mechanism --> get the context vector at step t
-        context = one_step_attention(a, s)
+        context = one_step_attention(a, s, a_proj)
 
         # apply the post-attention LSTM cell to the "context" vector.
         s, _, c = post_activation_LSTM_cell(context, initial_state=[s, c])
@@ -102,30 +107,124 @@ def model(Tx, Ty, n_a, n_s, human_vocab_size, machine_vocab_size):
     return model
 
 
+# format ids of format_date_x and year ranges the sweep reports accuracy for
+FORMAT_IDS = list(range(7))
+YEAR_RANGES = [(1900, 1949), (1950, 1999), (2000, 2049), (2050, 2099)]
+
+
+def sweep_grid(format_ids=FORMAT_IDS, years=range(1900, 2100), seed=0):
+    """
+    Generates the evaluation grid: every date of the given years (months 1-11, days 1-27) in every format id
+
+    Returns:
+    dates -- list of datetime.date
+    format_ids -- numpy-array of the format_date_x format id of each date string
+    date_strs -- list of lower cased human readable date strings
+    """
+
+    grid = [(date(year, month, day), format_id) for year in years for month in range(1, 12) for day in range(1, 28)
+            for format_id in format_ids]
+    dates = [dt for dt, _ in grid]
+    # format_date_x draws from the shared random module: seed it for a reproducible grid and restore its state
+    # afterwards, so that a sweep run inside a training or serving process does not reset its date generator
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        date_strs = [format_date_x(dt, format_id).lower() for dt, format_id in grid]
+    finally:
+        random.setstate(state)
+    return dates, np.array([format_id for _, format_id in grid]), date_strs
+
+
+def _dateparser_parse(date_str):
+    """
+    dateparser baseline for one date string, run in the process pool of evaluate_sweep
+    """
+
+    parsed = dateparser.parse(date_str)
+    return parsed.date().isoformat() if parsed is not None else None
+
+
+def _accuracy_by(groups, correct, n_groups):
+    """
+    Per group accuracy of a boolean array in one bincount pass
+    """
+
+    counts = np.bincount(groups, minlength=n_groups)
+    hits = np.bincount(groups, weights=correct, minlength=n_groups)
+    return counts, hits / np.maximum(counts, 1)
+
+
+def evaluate_sweep(model, format_ids=FORMAT_IDS, years=range(1900, 2100), batch_size=4096, processes=None,
+                   baseline=True, n_mismatches=20, parse=None):
+    """
+    Evaluates the model on the whole sweep grid with batched prediction, optionally alongside the dateparser
+    baseline run in a process pool
+
+    Arguments:
+    model -- Keras model instance, as built by model()
+    format_ids -- format ids of format_date_x to sweep
+    years -- years to sweep
+    batch_size -- number of strings per predict call
+    processes -- number of dateparser worker processes, defaults to the number of CPUs
+    baseline -- whether to also score the dateparser baseline
+    n_mismatches -- number of model mismatches to include in the report
+    parse -- optional function mapping a list of date strings to predictions, used instead of parse_dates
+
+    Returns:
+    report -- dictionary with overall, per format id and per year range accuracy, timings and sample mismatches
+    """
+
+    # sorted for the searchsorted lookup of the format index of every grid date
+    format_ids = sorted(set(format_ids))
+    dates, grid_format_ids, date_strs = sweep_grid(format_ids, years)
+    expected = np.array([dt.isoformat() for dt in dates])
+    year_ranges = [(lo, hi) for lo, hi in YEAR_RANGES if lo <= max(years) and hi >= min(years)]
+    range_ids = np.searchsorted([hi for _, hi in year_ranges], [dt.year for dt in dates])
+    format_index = np.searchsorted(format_ids, grid_format_ids)
+
+    start = time.time()
+    if parse is None:
+        predicted = parse_dates(model, date_strs, human_vocab, inv_machine_vocab, Tx, n_s, batch_size=batch_size)
+    else:
+        predicted = parse(date_strs)
+    model_seconds = time.time() - start
+    scores = {'model': np.array(predicted) == expected}
+
+    baseline_seconds = None
+    if baseline:
+        start = time.time()
+        with multiprocessing.Pool(processes) as pool:
+            baseline_predicted = pool.map(_dateparser_parse, date_strs, chunksize=1024)
+        baseline_seconds = time.time() - start
+        scores['dateparser'] = np.array(baseline_predicted, dtype=object) == expected
+
+    report = {'n': len(dates),
+              'seconds': {'model': model_seconds, 'dateparser': baseline_seconds},
+              'accuracy': {name: float(correct.mean()) for name, correct in scores.items()},
+              'by_format_id': {int(format_id): {'n': 0} for format_id in format_ids},
+              'by_year_range': {'%d-%d' % year_range: {'n': 0} for year_range in year_ranges},
+              'mismatches': []}
+    for name, correct in scores.items():
+        counts, accuracy = _accuracy_by(format_index, correct, len(format_ids))
+        for i, format_id in enumerate(format_ids):
+            report['by_format_id'][int(format_id)].update({'n': int(counts[i]), name: float(accuracy[i])})
+        counts, accuracy = _accuracy_by(range_ids, correct, len(year_ranges))
+        for i, year_range in enumerate(year_ranges):
+            report['by_year_range']['%d-%d' % year_range].update({'n': int(counts[i]), name: float(accuracy[i])})
+
+    for i in np.flatnonzero(~scores['model'])[:n_mismatches]:
+        report['mismatches'].append({'input': date_strs[i], 'format_id': int(grid_format_ids[i]),
+                                     'expected': expected[i], 'model': predicted[i],
+                                     'dateparser': baseline_predicted[i] if baseline else None})
+    return report
+
+
 if __name__ == "__main__":
-    s0 = np.zeros((1, n_s))
-    c0 = np.zeros((1, n_s))
     print(len(human_vocab), len(machine_vocab))
     model = model(Tx, Ty, n_a, n_s, len(human_vocab), len(machine_vocab))
     model.summary()
     #model.load_weights("model.h5")
     model.load_weights("model_64_128.h5")
 
-    faker = Faker()
-    for year in range(1900, 2100):
-        for month in range(1, 12):
-            for day in range(1,28):
-                dt = date(year, month, day)
-                date_str = format_date_x(dt).lower()
-                source = string_to_int(date_str, Tx, human_vocab)
-                source = np.array(list(map(lambda x: to_categorical(x, num_classes=len(human_vocab)), source)))
-                source = np.expand_dims(source, axis=0)
-                date_val = model.predict([source, s0, c0])
-                date_val = np.argmax(date_val, axis=-1)
-                date_val = [inv_machine_vocab[str(int(i))] for i in date_val]
-                date_val = ''.join(date_val)
-                date_parser_output = dateparser.parse(date_str).date()
-                if date_val != dt.isoformat():
-                    print(date_str, dt.isoformat(), 'model estimate', date_val, 'dateparser output', date_parser_output)
-    print('all set')
-
+    print(json.dumps(evaluate_sweep(model), indent=2))
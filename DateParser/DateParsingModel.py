@@ -1,4 +1,4 @@
-from keras.layers import Bidirectional, Concatenate, Dot, Input, LSTM
+from keras.layers import Bidirectional, Add, Dot, Input, LSTM
 from keras.layers import RepeatVector, Dense, Activation
 from keras.models import Model
 from nmt_utils import *
@@ -12,16 +12,19 @@ inv_machine_vocab = json.loads(open('inv_machine_vocab.json').read())
 
 Tx = int(30)
 Ty = int(10)
+n_a = 64
+n_s = 128
 
 repeator = RepeatVector(Tx)
-concatenator = Concatenate(axis=-1)
-densor1 = Dense(10, activation = "tanh")
+adder = Add()
+densor1 = SplitDense(10, encoder_dim=2*n_a, decoder_dim=n_s)
+tanh_activator = Activation("tanh")
 densor2 = Dense(1, activation = "relu")
 activator = Activation(softmax, name='attention_weights') # custom softmax
 dotor = Dot(axes = 1)
 
 
-def one_step_attention(a, s_prev):
+def one_step_attention(a, s_prev, a_proj):
     """
     Performs one step of attention: Outputs a context vector computed as a dot product of the attention weights
     "alphas" and the hidden states "a" of the Bi-LSTM.
@@ -29,17 +32,17 @@ def one_step_attention(a, s_prev):
     Arguments:
     a -- hidden state output of the Bi-LSTM, numpy-array of shape (m, Tx, 2*n_a)
     s_prev -- previous hidden state of the (post-attention) LSTM, numpy-array of shape (m, n_s)
+    a_proj -- densor1(a), the encoder half of densor1 computed once per sequence, numpy-array of shape (m, Tx, 10)
 
     Returns:
     context -- context vector, input of the next (post-attetion) LSTM cell
     """
 
-    # Use repeator to repeat s_prev to be of shape (m, Tx, n_s) so that you can concatenate it with all hidden states "a"
-    s_prev = repeator(s_prev)
-    # Use concatenator to concatenate a and s_prev on the last axis
-    concat = concatenator([a, s_prev])
-    # Use densor1 to propagate concat through a small fully-connected neural network to compute the "intermediate energies" variable e.
-    e = densor1(concat)
+    # Use densor1 to project s_prev with the decoder half of its kernel, then repeator to repeat it to shape (m, Tx, 10)
+    s_proj = repeator(densor1(s_prev))
+    # Add the precomputed projection of "a" and apply tanh to compute the "intermediate energies" variable e.
+    # (equivalent to the Dense layer on the concatenation of a and s_prev)
+    e = tanh_activator(adder([a_proj, s_proj]))
     # Use densor2 to propagate e through a small fully-connected neural network to compute the "energies" variable energies.
     energies = densor2(e)
     # Use "activator" on "energies" to compute the attention weights "alphas"
@@ -48,8 +51,6 @@ def one_step_attention(a, s_prev):
     context = dotor([alphas, a])
     return context
 
-n_a = 64
-n_s = 128
 post_activation_LSTM_cell = LSTM(n_s, return_state=True)
 output_layer = Dense(len(machine_vocab), activation=softmax)
 
@@ -81,11 +82,13 @@ def model(Tx, Ty, n_a, n_s, human_vocab_size, machine_vocab_size):
 
     # pre-attention Bi-LSTM.
     a = Bidirectional(LSTM(units=n_a, input_shape=X.shape, return_sequences=True))(X)
+    # encoder half of the attention's densor1, the same for all Ty steps
+    a_proj = densor1(a)
 
     # Iterate for Ty steps
     for t in range(Ty):
         # one step of the attention mechanism --> get the context vector at step t
-        context = one_step_attention(a, s)
+        context = one_step_attention(a, s, a_proj)
 
         # apply the post-attention LSTM cell to the "context" vector.
         s, _, c = post_activation_LSTM_cell(context, initial_state=[s, c])
@@ -114,9 +117,7 @@ class DateParser(Resource):
         args                                        = parser.parse_args()
         date_str                                    = args["date_str"]
         print(date_str)
-        source                                      = string_to_int(date_str, Tx, human_vocab)
-        source                                      = np.array(list(map(lambda x: to_categorical(x, num_classes=len(human_vocab)), source)))
-        source                                      = np.expand_dims(source, axis=0)
+        source                                      = to_one_hot(encode_strings([date_str], Tx, human_vocab), len(human_vocab))
         date_val                                    = self.model.predict([source, self.s0, self.c0])
         date_val                                    = np.argmax(date_val, axis=-1)
         date_val                                    = [inv_machine_vocab[str(int(i))] for i in date_val]
@@ -0,0 +1,156 @@
+"""
+Step-wise decoding of the NumPy date parser constrained to the YYYY-MM-DD output grammar, greedy or with a
+small beam.
+
+The post-attention LSTM is not fed its previous output, so its states only depend on the encoder states: the
+network is run once per sequence (one encoder pass, Ty decoder steps), and the greedy and beam searches only
+differ in how they pick characters from the resulting scores.
+"""
+from datetime import datetime
+import numpy as np
+from encoding import encode_strings, indices_to_strings
+
+# allowed characters at each position of YYYY-MM-DD, either a string or a dictionary mapping the previous
+# character to the allowed characters
+DATE_GRAMMAR = ['0123456789', '0123456789', '0123456789', '0123456789', '-',
+                '01', {'0': '123456789', '1': '012'}, '-',
+                '0123', {'0': '123456789', '1': '0123456789', '2': '0123456789', '3': '01'}]
+
+
+def grammar_masks(grammar, vocab):
+    """
+    Arguments:
+    grammar -- list of per position rules, see DATE_GRAMMAR
+    vocab -- machine vocabulary, dictionary mapping characters to indices
+
+    Returns:
+    masks -- boolean array of shape (len(grammar), len(vocab), len(vocab)), masks[t, prev, char] is True if
+             char may follow prev at position t
+    """
+
+    masks = np.zeros((len(grammar), len(vocab), len(vocab)), dtype=bool)
+    for t, rule in enumerate(grammar):
+        for prev, prev_index in vocab.items():
+            allowed = rule if isinstance(rule, str) else rule.get(prev, '')
+            masks[t, prev_index, [vocab[char] for char in allowed]] = True
+    return masks
+
+
+def is_date(string):
+    try:
+        datetime.strptime(string, '%Y-%m-%d')
+    except ValueError:
+        return False
+    return True
+
+
+class ConstrainedDecoder(object):
+    """
+    Decodes with a NumpyDateParser so that characters the grammar does not allow at a position are never
+    scored: the output layer is only evaluated on the allowed columns, and skipped altogether at positions
+    with a single allowed character (the '-' separators).
+    """
+
+    def __init__(self, model, grammar=DATE_GRAMMAR):
+        """
+        Arguments:
+        model -- NumpyDateParser instance
+        grammar -- list of per position rules, one per output step of the model
+        """
+        if len(grammar) != model.Ty:
+            raise ValueError('the grammar has %d positions, the model %d output steps' % (len(grammar), model.Ty))
+        self.model = model
+        self.masks = grammar_masks(grammar, model.machine_vocab)
+        self.columns = [np.flatnonzero(mask.any(axis=0)) for mask in self.masks]
+        self.output_kernels = [model.output_kernel[:, columns] for columns in self.columns]
+        self.output_biases = [model.output_bias[columns] for columns in self.columns]
+
+    def log_probs(self, X):
+        """
+        Arguments:
+        X -- int array of human vocabulary indices of shape (m, Tx)
+
+        Returns:
+        log_probs -- array of shape (m, Ty, machine_vocab_size), log-probabilities normalized over the characters
+                     allowed at each position and -inf for every other character
+        """
+
+        m = len(X)
+        a, a_proj = self.model.encode(X)
+        s, c = self.model.initial_state(m)
+        kernels = self.model.decoder_kernels()
+        log_probs = np.full((m, self.model.Ty, len(self.model.machine_vocab)), -np.inf, dtype=np.float32)
+        for t, columns in enumerate(self.columns):
+            s, c = self.model.decoder_step(a, a_proj, s, c, kernels)
+            if len(columns) == 1:
+                log_probs[:, t, columns[0]] = 0.
+                continue
+            logits = s @ self.output_kernels[t] + self.output_biases[t]
+            logits -= logits.max(axis=1, keepdims=True)
+            log_probs[:, t, columns] = logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+        return log_probs
+
+    def greedy(self, X):
+        """
+        Picks the best allowed character at each step given the characters picked before
+
+        Returns:
+        indices -- int array of machine vocabulary indices of shape (m, Ty)
+        """
+
+        log_probs = self.log_probs(X)
+        m, Ty, _ = log_probs.shape
+        indices = np.empty((m, Ty), dtype=np.intp)
+        prev = np.zeros(m, dtype=np.intp)
+        for t in range(Ty):
+            prev = indices[:, t] = np.where(self.masks[t][prev], log_probs[:, t], -np.inf).argmax(axis=1)
+        return indices
+
+    def beam(self, X, beam_width=3):
+        """
+        Keeps the beam_width best scoring partial outputs at each step and returns the best complete output that
+        is a valid calendar date (e.g. no 2019-02-30), or the best output if none of them is
+
+        Returns:
+        indices -- int array of machine vocabulary indices of shape (m, Ty)
+        """
+
+        log_probs = self.log_probs(X)
+        m, Ty, V = log_probs.shape
+        rows = np.arange(m)[:, np.newaxis]
+        scores = np.full((m, beam_width), -np.inf, dtype=np.float32)
+        scores[:, 0] = 0.
+        last = np.zeros((m, beam_width), dtype=np.intp)
+        tokens = np.zeros((m, beam_width, 0), dtype=np.intp)
+        for t in range(Ty):
+            candidates = scores[:, :, np.newaxis] + np.where(self.masks[t][last], log_probs[:, np.newaxis, t], -np.inf)
+            candidates = candidates.reshape(m, beam_width * V)
+            best = np.argsort(-candidates, axis=1, kind='stable')[:, :beam_width]
+            beam_index, last = np.divmod(best, V)
+            scores = candidates[rows, best]
+            tokens = np.concatenate([tokens[rows, beam_index], last[:, :, np.newaxis]], axis=2)
+
+        # beams are sorted by score, so the first valid one is the best valid one
+        strings = indices_to_strings(tokens.reshape(m * beam_width, Ty), self.model.inv_machine_vocab)
+        valid = np.array([is_date(string) for string in strings]).reshape(m, beam_width) & np.isfinite(scores)
+        choice = np.where(valid.any(axis=1), valid.argmax(axis=1), 0)
+        return tokens[np.arange(m), choice]
+
+    def parse(self, strings, batch_size=1024, beam_width=1):
+        """
+        Arguments:
+        strings -- list of human readable date strings
+        batch_size -- number of strings run through the network at once
+        beam_width -- 1 for constrained greedy decoding, more for beam search
+
+        Returns:
+        dates -- list of machine readable dates (YYYY-MM-DD), one per input string
+        """
+
+        X = encode_strings(list(strings), self.model.Tx, self.model.human_vocab)
+        dates = []
+        for start in range(0, len(X), batch_size):
+            batch = X[start:start + batch_size]
+            indices = self.greedy(batch) if beam_width == 1 else self.beam(batch, beam_width)
+            dates.extend(indices_to_strings(indices, self.model.inv_machine_vocab))
+        return dates
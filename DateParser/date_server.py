@@ -0,0 +1,190 @@
+"""
+HTTP date parsing service on the NumPy date parser. Concurrently handled requests are coalesced into
+micro-batches: the first queued request waits at most max_wait seconds for others to join it, and the whole
+batch goes through the model in one call.
+
+usage: python date_server.py date_parser.npz [port]
+
+GET  /parse/<date_string:path>             -> {"result": "2007-07-10"}, the string may contain slashes
+                                              (GET /parse/5/12/2018), slash dates always go to the model
+POST /parse  {"dates": ["...", "..."]}     -> {"result": ["...", "..."]}
+GET  /stats                                -> queue depth and batch size histograms, cache and fast path counters
+"""
+import sys
+import time
+import threading
+from collections import Counter, deque
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer
+from bottle import Bottle, request, abort, run
+from numpy_model import NumpyDateParser
+from rule_date_parser import HybridDateParser
+from prediction_cache import CachedDateParser
+
+
+def _bucket(n):
+    """
+    Power of two histogram bucket of n: the smallest power of two >= n
+    """
+
+    return 1 << max(n - 1, 0).bit_length()
+
+
+def _histogram(counter):
+    return {'<=%d' % bucket: counter[bucket] for bucket in sorted(counter)}
+
+
+class _Pending(object):
+    """
+    Strings of one request waiting in the MicroBatcher queue
+    """
+
+    def __init__(self, strings):
+        self.strings = strings
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher(object):
+    """
+    Coalesces the strings of concurrent submit calls into batches of up to max_batch_size strings, parsed by a
+    single background thread
+    """
+
+    def __init__(self, parse, max_batch_size=1024, max_wait=0.005):
+        """
+        Arguments:
+        parse -- function mapping a list of date strings to a list of machine readable dates
+        max_batch_size -- largest number of strings sent to parse at once (a larger request is sent alone)
+        max_wait -- seconds the oldest queued request waits for others before its batch is parsed
+        """
+        self._parse = parse
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = deque()
+        self._queued_strings = 0
+        self._condition = threading.Condition()
+        self.counts = {'requests': 0, 'strings': 0, 'batches': 0}
+        self.queue_depths = Counter()
+        self.batch_sizes = Counter()
+        thread = threading.Thread(target=self._run, name='micro-batcher')
+        thread.daemon = True
+        thread.start()
+
+    def submit(self, strings):
+        """
+        Queues strings and blocks until their batch is parsed
+
+        Returns:
+        dates -- list of machine readable dates (YYYY-MM-DD), one per input string
+        """
+
+        pending = _Pending(list(strings))
+        if not pending.strings:
+            return []
+        with self._condition:
+            self._queue.append(pending)
+            self._queued_strings += len(pending.strings)
+            self.counts['requests'] += 1
+            self.counts['strings'] += len(pending.strings)
+            self.queue_depths[_bucket(self._queued_strings)] += 1
+            self._condition.notify()
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            deadline = time.time() + self.max_wait
+            while self._queued_strings < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = [self._queue.popleft()]
+            size = len(batch[0].strings)
+            while self._queue and size + len(self._queue[0].strings) <= self.max_batch_size:
+                batch.append(self._queue.popleft())
+                size += len(batch[-1].strings)
+            self._queued_strings -= size
+            self.counts['batches'] += 1
+            self.batch_sizes[_bucket(size)] += 1
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            strings = [string for pending in batch for string in pending.strings]
+            try:
+                dates = self._parse(strings)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                continue
+            start = 0
+            for pending in batch:
+                pending.result = dates[start:start + len(pending.strings)]
+                start += len(pending.strings)
+                pending.done.set()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self.counts)
+            stats['queued'] = self._queued_strings
+            stats['mean_batch_size'] = self.counts['strings'] / self.counts['batches'] if self.counts['batches'] else 0.0
+            stats['queue_depth_histogram'] = _histogram(self.queue_depths)
+            stats['batch_size_histogram'] = _histogram(self.batch_sizes)
+        return stats
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    # one thread per connection, so that concurrent requests can meet in the MicroBatcher queue
+    daemon_threads = True
+
+
+def create_app(parser, max_batch_size=1024, max_wait=0.005, cache_size=100000):
+    """
+    Arguments:
+    parser -- NumpyDateParser (or anything with a parse(strings) method)
+    max_batch_size -- largest micro-batch sent to the model
+    max_wait -- seconds a request waits for others to join its micro-batch
+    cache_size -- number of predictions kept in the LRU cache in front of the model
+
+    Returns:
+    app -- bottle application
+    """
+
+    hybrid = HybridDateParser(parser.parse)
+    batcher = MicroBatcher(hybrid.parse, max_batch_size, max_wait)
+    cached = CachedDateParser(batcher.submit, cache_size)
+    app = Bottle()
+
+    @app.get('/parse/<date_string:path>')
+    def parse_one(date_string):
+        return {'result': cached.parse_date(date_string)}
+
+    @app.post('/parse')
+    def parse_many():
+        body = request.json
+        strings = body.get('dates') if isinstance(body, dict) else body
+        if not isinstance(strings, list) or not all(isinstance(string, str) for string in strings):
+            abort(400, 'expected a JSON body {"dates": [date strings]}')
+        return {'result': cached.parse(strings)}
+
+    @app.get('/stats')
+    def stats():
+        return {'batching': batcher.stats(), 'cache': cached.stats(), 'paths': hybrid.stats()}
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = NumpyDateParser.load(sys.argv[1])
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 5534
+    run(create_app(parser), host='localhost', port=port, server_class=ThreadingWSGIServer)
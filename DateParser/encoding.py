@@ -0,0 +1,101 @@
+"""
+Keras free encoding and decoding helpers shared by nmt_utils and the NumPy inference path
+"""
+import numpy as np
+
+
+def _lookup_table(vocab):
+    """
+    Builds a numpy array mapping character code points to their index in "vocab". Code point 0 (the
+    padding numpy uses for fixed width strings) maps to '<pad>', the last entry catches every code point
+    outside of the table and, like characters missing from "vocab", maps to '<unk>' (-1 if the vocab has none)
+    """
+
+    chars = [c for c in vocab if len(c) == 1]
+    unk = vocab.get('<unk>', -1)
+    table = np.full(max(map(ord, chars)) + 2, unk, dtype=np.int32)
+    for c in chars:
+        table[ord(c)] = vocab[c]
+    table[0] = vocab.get('<pad>', unk)
+    return table
+
+
+def encode_strings(strings, length, vocab, out=None):
+    """
+    Vectorized string_to_int: converts a list of strings into an int array of vocabulary indices with a
+    single numpy gather over the strings' code points
+
+    Arguments:
+    strings -- list of input strings, e.g. ['Wed 10 Jul 2007', '3 May 1979']
+    length -- the number of time steps you'd like, determines if the outputs will be padded or cut
+    vocab -- vocabulary, dictionary used to index every character of the strings
+    out -- optional preallocated int array of shape (m, length) to write the indices into
+
+    Returns:
+    out -- int array of shape (m, length)
+    """
+
+    strings = [s.lower().replace(',', '') for s in strings]
+    codes = np.array(strings, dtype='U%d' % length).view(np.uint32).reshape(len(strings), length)
+    table = _lookup_table(vocab)
+    if out is not None:
+        table = table.astype(out.dtype, copy=False)
+    np.minimum(codes, len(table) - 1, out=codes)
+    out = np.take(table, codes, out=out)
+    if out.size and out.min() < 0:
+        raise ValueError('characters outside of the vocabulary and no <unk> entry to map them to')
+    return out
+
+
+def to_one_hot(X, num_classes, out=None):
+    """
+    Vectorized to_categorical: one-hot encodes an int array of indices, writing straight into a single
+    (preallocated) float32 buffer
+
+    Arguments:
+    X -- int array of shape (m, T)
+    num_classes -- size of the vocabulary
+    out -- optional preallocated float32 array of shape (m, T, num_classes)
+
+    Returns:
+    out -- float32 array of shape (m, T, num_classes)
+    """
+
+    if out is None:
+        out = np.zeros(X.shape + (num_classes,), dtype=np.float32)
+    else:
+        out.fill(0)
+    np.put_along_axis(out, X[..., np.newaxis], 1, axis=-1)
+    return out
+
+
+def decode_predictions(prediction, inv_vocab):
+    """
+    Converts the Ty softmax outputs of the attention model into machine readable strings in bulk
+
+    Arguments:
+    prediction -- list of Ty numpy-arrays of shape (m, machine_vocab_size), as returned by model.predict
+    inv_vocab -- dictionary mapping machine readable indexes (int or str keys) to machine readable characters
+
+    Returns:
+    strings -- list of m machine readable strings
+    """
+
+    return indices_to_strings(np.argmax(np.stack(prediction, axis=1), axis=-1), inv_vocab)
+
+
+def indices_to_strings(indices, inv_vocab):
+    """
+    Vectorized int_to_string: converts an int array of machine vocabulary indices into strings with one lookup
+
+    Arguments:
+    indices -- int array of shape (m, Ty)
+    inv_vocab -- dictionary mapping machine readable indexes (int or str keys) to machine readable characters
+
+    Returns:
+    strings -- list of m machine readable strings
+    """
+
+    table = np.array([inv_vocab[k] for k in sorted(inv_vocab, key=int)])
+    chars = np.ascontiguousarray(table[indices])
+    return chars.view('<U%d' % chars.shape[1]).ravel().tolist()
@@ -0,0 +1,64 @@
+"""
+Exports a trained DateParser model to a self-contained inference artifact (.npz) holding the weights and,
+as JSON, the vocabularies and model dimensions. The artifact is loaded by numpy_model.NumpyDateParser.
+
+usage: python export_model.py model_64_128.h5 date_parser.npz
+"""
+import sys
+import json
+import numpy as np
+import keras.backend as K
+from keras.layers import Bidirectional, Embedding, LSTM, Dense
+from nmt_utils import SplitDense
+
+
+def export_model(model, human_vocab, machine_vocab, inv_machine_vocab, path):
+    """
+    Arguments:
+    model -- Keras model instance built by model() (one-hot or Embedding input)
+    human_vocab -- vocabulary the model input was encoded with
+    machine_vocab -- vocabulary of the model outputs
+    inv_machine_vocab -- dictionary mapping machine readable indexes to machine readable characters
+    path -- file to write the artifact to
+    """
+
+    weights = {}
+    for layer in model.layers:
+        if isinstance(layer, Bidirectional):
+            # forward LSTM weights followed by the backward ones, each (kernel, recurrent_kernel, bias)
+            for i, weight in enumerate(layer.get_weights()):
+                direction = 'forward' if i < 3 else 'backward'
+                name = ('kernel', 'recurrent_kernel', 'bias')[i % 3]
+                weights['encoder_%s_%s' % (direction, name)] = weight
+            n_a = layer.forward_layer.units
+            recurrent_activation = layer.forward_layer.get_config()['recurrent_activation']
+        elif isinstance(layer, Embedding):
+            weights['embedding'], = layer.get_weights()
+        elif isinstance(layer, LSTM):
+            weights['decoder_kernel'], weights['decoder_recurrent_kernel'], weights['decoder_bias'] = layer.get_weights()
+            n_s = layer.units
+        elif isinstance(layer, SplitDense):
+            weights['attention_kernel'], weights['attention_bias'] = layer.get_weights()
+        elif isinstance(layer, Dense):
+            # densor1 (tanh, in models built before SplitDense), densor2 (relu) and the output layer (softmax)
+            prefix = {'tanh': 'attention', 'relu': 'energy', 'softmax': 'output'}[layer.activation.__name__]
+            weights[prefix + '_kernel'], weights[prefix + '_bias'] = layer.get_weights()
+
+    config = {'Tx': K.int_shape(model.inputs[0])[1],
+              'Ty': len(model.outputs),
+              'n_a': n_a,
+              'n_s': n_s,
+              'recurrent_activation': recurrent_activation,
+              'human_vocab': human_vocab,
+              'machine_vocab': machine_vocab,
+              'inv_machine_vocab': {str(k): v for k, v in inv_machine_vocab.items()}}
+    np.savez(path, config=json.dumps(config), **{name: w.astype(np.float32) for name, w in weights.items()})
+
+
+if __name__ == "__main__":
+    from DateParserTester import model, Tx, Ty, n_a, n_s, human_vocab, machine_vocab, inv_machine_vocab
+
+    date_model = model(Tx, Ty, n_a, n_s, len(human_vocab), len(machine_vocab))
+    date_model.load_weights(sys.argv[1])
+    export_model(date_model, human_vocab, machine_vocab, inv_machine_vocab, sys.argv[2])
+    print("Exported", sys.argv[1], "to", sys.argv[2])
@@ -1,12 +1,26 @@
 import numpy as np
 from faker import Faker
 import random
+import json
+import os
+import hashlib
+import multiprocessing
+import time
+import re
 from tqdm import tqdm
-from babel.dates import format_date
-from keras.utils import to_categorical
+from encoding import encode_strings, to_one_hot, decode_predictions, indices_to_strings
+from babel import Locale
+from babel.dates import format_date, parse_pattern
+from keras.utils import to_categorical, Sequence
+from keras.layers import Layer
+from keras.callbacks import Callback
 import keras.backend as K
 import matplotlib.pyplot as plt
 from datetime import date
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
 fake = Faker()
 fake.seed(0)
@@ -25,13 +39,14 @@ def num_postfix(i):
     return str(i)+postfix
 
 
-def format_date_x(dt):
+def format_date_x(dt, format_id=None):
     day_name = random.choice([str(dt.strftime('%a')), str(dt.strftime('%A'))])
     day_of_month = random.choice([str(dt.strftime('%d')), str(int(str(dt.strftime('%d'))))])
     month_numb = str(dt.strftime('%m'))
     month_name = random.choice([str(dt.strftime('%b')), str(dt.strftime('%B'))])
     year = random.choice([str(dt.strftime('%Y')), str(dt.strftime('%Y'))])
-    format_id = random.choice([2])
+    if format_id is None:
+        format_id = random.choice([2])
     if format_id == 0: # MM/DD/YY
         dt_str = str(dt.strftime('%D'))
     elif format_id == 1:# 05 12 18,
@@ -74,14 +89,111 @@ FORMATS = ['short',
            'MMMM d, YYY',
            'dd.MM.YY']
 
-# change this if you want it to work with another language
+# change this (or pass locales to load_dataset/build_dataset) if you want it to work with other languages
 LOCALES = ['en_US']
 
-def load_date():
+def _number_field(value, width):
+    return lambda dt: '%0*d' % (width, value(dt))
+
+def _name_field(names, value):
+    names = dict(names.items())
+    return lambda dt: names[value(dt)]
+
+def _date_fields(locale):
+    """
+        Formatters of the babel date pattern fields, as functions of a date, with the locale's month, day and
+        era names resolved once. Week-based years (Y) are formatted as the calendar year, which is also what the
+        machine readable dates use.
+    """
+    
+    fields = {}
+    for letter in 'yY':
+        for width in (1, 3, 4):
+            fields[letter * width] = _number_field(lambda dt: dt.year, width)
+        fields[letter * 2] = _number_field(lambda dt: dt.year % 100, 2)
+    for width in (1, 2):
+        fields['d' * width] = _number_field(lambda dt: dt.day, width)
+        fields['M' * width] = fields['L' * width] = _number_field(lambda dt: dt.month, width)
+    for letter, context in (('M', 'format'), ('L', 'stand-alone')):
+        for width, name in ((3, 'abbreviated'), (4, 'wide'), (5, 'narrow')):
+            fields[letter * width] = _name_field(locale.months[context][name], lambda dt: dt.month)
+    for letters, context in ((['E', 'EE', 'EEE', 'EEEE', 'EEEEE', 'EEEEEE'], 'format'),
+                             (['c', 'cc', 'ccc', 'cccc', 'ccccc', 'cccccc'], 'stand-alone')):
+        for letter, name in zip(letters, ['abbreviated'] * 3 + ['wide', 'narrow', 'short']):
+            if letter not in ('c', 'cc'):  # numeric local day of week
+                fields[letter] = _name_field(locale.days[context][name], lambda dt: dt.weekday())
+    for letters, name in ((['G', 'GG', 'GGG'], 'abbreviated'), (['GGGG'], 'wide'), (['GGGGG'], 'narrow')):
+        for letter in letters:
+            fields[letter] = _name_field(locale.eras[name], lambda dt: 1)
+    return fields
+
+class LocaleDateTable(object):
+    """
+        Precomputed date formatting of one locale: month/day names and the compiled FORMATS patterns are
+        resolved once, so that formatting a date is a single string interpolation instead of a babel
+        format_date call resolving the locale data every time. Patterns with fields the table does not know
+        fall back to format_date.
+    """
+    
+    def __init__(self, locale, formats=FORMATS):
+        self.locale = locale
+        babel_locale = Locale.parse(locale)
+        fields = _date_fields(babel_locale)
+        self.patterns = {}
+        for format in set(formats):
+            if format in ('short', 'medium', 'long', 'full'):
+                pattern = babel_locale.date_formats[format]
+            else:
+                pattern = parse_pattern(format)
+            names = set(re.findall(r'%\((\w+)\)s', pattern.format))
+            if names <= set(fields):
+                self.patterns[format] = (pattern.format, [(name, fields[name]) for name in names])
+            else:
+                self.patterns[format] = None
+        
+        # every character these patterns can produce: all months and week days of a year, and the digits
+        self.chars = set('0123456789')
+        for day in range(366):
+            dt = date.fromordinal(date(2000, 1, 1).toordinal() + day)
+            for format in self.patterns:
+                self.chars.update(self.format(dt, format).lower().replace(',', ''))
+    
+    def format(self, dt, format):
+        compiled = self.patterns.get(format)
+        if compiled is None:
+            return format_date(dt, format=format, locale=self.locale)
+        pattern, fields = compiled
+        return pattern % {name: field(dt) for name, field in fields}
+
+LOCALE_TABLES = {}
+
+def locale_table(locale):
+    """
+        Returns the LocaleDateTable of a locale, built on first use
+    """
+    
+    if locale not in LOCALE_TABLES:
+        LOCALE_TABLES[locale] = LocaleDateTable(locale)
+    return LOCALE_TABLES[locale]
+
+def locale_chars(locales):
+    """
+        Characters of the human readable dates of all the locales, so that human_vocab covers every locale
+        even when some of its characters are rare in the generated sample
+    """
+    
+    chars = set()
+    for locale in locales:
+        chars.update(locale_table(locale).chars)
+    return chars
+
+def load_date(locales=None):
     """
         Loads some fake dates 
+        :locales: locales to format the dates in, defaults to LOCALES
         :returns: tuple containing human readable string, machine readable string, and date object
     """
+    locales = locales or LOCALES
     month = random.choice(range(1,12))
     if month in [1, 3, 5, 7, 8, 10, 12]:
         dom = random.choice(range(1,31))
@@ -93,7 +205,9 @@ def load_date():
     dt = date(year, month, dom)
     try:
         if random.choice([0, 1]) == 0:
-            human_readable = format_date(dt, format=random.choice(FORMATS),  locale='en_US') # locale=random.choice(LOCALES))
+            format = random.choice(FORMATS)
+            locale = locales[0] if len(locales) == 1 else random.choice(locales)
+            human_readable = locale_table(locale).format(dt, format)
         else:
             human_readable = format_date_x(dt)
         human_readable = human_readable.lower()
@@ -105,10 +219,11 @@ def load_date():
 
     return human_readable, machine_readable, dt
 
-def load_dataset(m):
+def load_dataset(m, locales=None):
     """
         Loads a dataset with m examples and vocabularies
         :m: the number of examples to generate
+        :locales: locales the dates are formatted in, defaults to LOCALES
     """
     
     human_vocab = set()
@@ -118,30 +233,231 @@ def load_dataset(m):
     
 
     for i in tqdm(range(m)):
-        h, m, _ = load_date()
+        h, m, _ = load_date(locales)
         if h is not None:
             dataset.append((h, m))
             human_vocab.update(tuple(h))
             machine_vocab.update(tuple(m))
     
-    human = dict(zip(sorted(human_vocab) + ['<unk>', '<pad>'], 
-                     list(range(len(human_vocab) + 2))))
-    inv_machine = dict(enumerate(sorted(machine_vocab)))
-    machine = {v:k for k,v in inv_machine.items()}
+    # every character the locales can produce, not only those drawn in this sample
+    human_vocab.update(locale_chars(locales or LOCALES))
+    human, machine, inv_machine = build_vocabs(human_vocab, machine_vocab)
  
     return dataset, human, machine, inv_machine
 
-def preprocess_data(dataset, human_vocab, machine_vocab, Tx, Ty):
+def build_vocabs(human_chars, machine_chars):
+    """
+        Builds the vocabularies from the sets of characters seen in the human and machine readable dates
+        :returns: tuple containing human vocab, machine vocab and inverse machine vocab
+    """
+    
+    human = dict(zip(sorted(human_chars) + ['<unk>', '<pad>'], 
+                     list(range(len(human_chars) + 2))))
+    inv_machine = dict(enumerate(sorted(machine_chars)))
+    machine = {v:k for k,v in inv_machine.items()}
+    
+    return human, machine, inv_machine
+
+def _load_shard(shard):
+    """
+        Generates one shard of build_dataset in a worker process, seeded from the shard's own seed
+    """
+    
+    seed, m, locales = shard
+    random.seed(seed)
+    human_chars = set()
+    machine_chars = set()
+    dataset = []
+    for i in range(m):
+        h, m_, _ = load_date(locales)
+        if h is not None:
+            dataset.append((h, m_))
+            human_chars.update(h)
+            machine_chars.update(m_)
+    return dataset, human_chars, machine_chars
+
+def build_dataset(m, seed=0, processes=None, shard_size=10000, path=None, Tx=30, Ty=10, locales=None):
+    """
+        Parallel load_dataset: shards the generation of m examples across a process pool. Shard i is
+        generated after seeding random with seed * 1000003 + i, so the dataset only depends on m, seed and
+        shard_size, not on the number of processes or on the global random state.
+        :m: the number of examples to generate
+        :seed: base seed the shard seeds are derived from
+        :processes: number of worker processes, defaults to the number of CPUs
+        :shard_size: number of examples generated per shard
+        :path: if given, the encoded dataset is also written there with save_dataset
+        :locales: locales the dates are formatted in, defaults to LOCALES
+        :returns: tuple containing dataset, human vocab, machine vocab and inverse machine vocab
+    """
+    
+    shards = [(seed * 1000003 + i, min(shard_size, m - start), locales)
+              for i, start in enumerate(range(0, m, shard_size))]
+    human_chars = set()
+    machine_chars = set()
+    dataset = []
+    
+    with multiprocessing.Pool(processes) as pool:
+        for shard_dataset, shard_human, shard_machine in tqdm(pool.imap(_load_shard, shards), total=len(shards)):
+            dataset.extend(shard_dataset)
+            human_chars.update(shard_human)
+            machine_chars.update(shard_machine)
+    
+    human_chars.update(locale_chars(locales or LOCALES))
+    human, machine, inv_machine = build_vocabs(human_chars, machine_chars)
+    if path is not None:
+        save_dataset(path, dataset, human, machine, Tx, Ty)
+    
+    return dataset, human, machine, inv_machine
+
+def save_dataset(path, dataset, human_vocab, machine_vocab, Tx, Ty):
+    """
+        Writes a dataset encoded as index arrays of the smallest fitting unsigned int type (uint8 for the
+        usual vocab sizes), together with both vocabularies, to a compressed .npz file
+    """
+    
+    X, Y, _, _ = preprocess_data(dataset, human_vocab, machine_vocab, Tx, Ty, one_hot=False)
+    np.savez_compressed(path,
+                        X=X.astype(np.min_scalar_type(len(human_vocab) - 1)),
+                        Y=Y.astype(np.min_scalar_type(len(machine_vocab) - 1)),
+                        human_vocab=json.dumps(human_vocab),
+                        machine_vocab=json.dumps(machine_vocab))
+
+def load_encoded_dataset(path):
+    """
+        Reads a dataset written by save_dataset
+        :returns: tuple containing X, Y, human vocab, machine vocab and inverse machine vocab
+    """
+    
+    with np.load(path) as data:
+        X, Y = data['X'], data['Y']
+        human = json.loads(str(data['human_vocab']))
+        machine = json.loads(str(data['machine_vocab']))
+    inv_machine = {v:k for k,v in machine.items()}
+    
+    return X, Y, human, machine, inv_machine
+
+class DateSequence(Sequence):
+    """
+    Streams freshly generated (load_date) batches instead of a fixed dataset, so the number of examples seen
+    during training is not capped by RAM and every epoch sees new dates and formats. Being a keras Sequence,
+    it can be passed to model.fit_generator(..., workers=n, use_multiprocessing=True, max_queue_size=q) to
+    generate batches in parallel workers ahead of training into a bounded queue.
+    
+    Batches are reproducible: batch idx of epoch e is generated after seeding random with (seed, e, idx),
+    which also keeps parallel workers from producing identical batches.
+    """
+    
+    def __init__(self, human_vocab, machine_vocab, Tx, Ty, n_s, batch_size=5000, steps_per_epoch=20,
+                 one_hot=True, seed=0, locales=None):
+        """
+        Arguments:
+        human_vocab -- vocabulary of the human readable dates, e.g. as returned by load_dataset
+        machine_vocab -- vocabulary of the machine readable dates
+        Tx -- length of the input sequence
+        Ty -- length of the output sequence
+        n_s -- hidden state size of the post-attention LSTM, for the zero initial states s0 and c0
+        batch_size -- number of examples per batch
+        steps_per_epoch -- number of batches per epoch
+        one_hot -- if False, yields int indices and (batch_size, 1) integer targets for an Embedding model
+        seed -- base seed of the generated batches
+        locales -- locales the dates are formatted in, defaults to LOCALES
+        """
+        self.human_vocab = human_vocab
+        self.machine_vocab = machine_vocab
+        self.Tx = Tx
+        self.Ty = Ty
+        self.batch_size = batch_size
+        self.steps_per_epoch = steps_per_epoch
+        self.one_hot = one_hot
+        self.seed = seed
+        self.locales = locales
+        self.epoch = 0
+        self.s0 = np.zeros((batch_size, n_s), dtype=np.float32)
+        self.c0 = np.zeros((batch_size, n_s), dtype=np.float32)
+    
+    def __len__(self):
+        return self.steps_per_epoch
+    
+    def __getitem__(self, idx):
+        random.seed((self.seed * 1000003 + self.epoch) * 1000003 + idx)
+        dataset = []
+        while len(dataset) < self.batch_size:
+            h, m, _ = load_date(self.locales)
+            if h is not None:
+                dataset.append((h, m))
+        X, Y, Xoh, Yoh = preprocess_data(dataset, self.human_vocab, self.machine_vocab, self.Tx, self.Ty,
+                                         one_hot=self.one_hot)
+        if self.one_hot:
+            return [Xoh, self.s0, self.c0], list(Yoh.swapaxes(0, 1))
+        return [X, self.s0, self.c0], list(Y.T[..., np.newaxis])
+    
+    def on_epoch_end(self):
+        self.epoch += 1
+
+def load_cached_dataset(m, Tx, Ty, seed=0, shard_size=10000, cache_dir='dataset_cache', processes=None,
+                        locales=None):
+    """
+        Loads the encoded dataset of build_dataset(m, seed, shard_size) from an on-disk cache, building and
+        caching it on the first call. The cache is keyed by (m, seed, shard_size, FORMATS, locales, Tx, Ty):
+        X and Y are stored as .npy files and memory-mapped read-only, next to the human_vocab.json and
+        machine_vocab.json they were encoded with.
+        :returns: tuple containing X, Y, human vocab, machine vocab and inverse machine vocab
+    """
+    
+    key = json.dumps([m, seed, shard_size, FORMATS, locales or LOCALES, Tx, Ty])
+    path = os.path.join(cache_dir, 'dataset_' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16])
+    files = [os.path.join(path, name) for name in ('X.npy', 'Y.npy', 'human_vocab.json', 'machine_vocab.json')]
+    
+    if not all(os.path.exists(f) for f in files):
+        dataset, human, machine, _ = build_dataset(m, seed=seed, processes=processes, shard_size=shard_size,
+                                                   locales=locales)
+        X, Y, _, _ = preprocess_data(dataset, human, machine, Tx, Ty, one_hot=False)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        # write under temporary names and rename, so an interrupted build never leaves a partial entry behind
+        for f, array in zip(files[:2], (X.astype(np.min_scalar_type(len(human) - 1)),
+                                        Y.astype(np.min_scalar_type(len(machine) - 1)))):
+            np.save(f + '.tmp.npy', array)
+            os.replace(f + '.tmp.npy', f)
+        for f, vocab in zip(files[2:], (human, machine)):
+            with open(f + '.tmp', 'w') as fp:
+                json.dump(vocab, fp)
+            os.replace(f + '.tmp', f)
+    
+    X = np.load(files[0], mmap_mode='r')
+    Y = np.load(files[1], mmap_mode='r')
+    with open(files[2]) as fp:
+        human = json.load(fp)
+    with open(files[3]) as fp:
+        machine = json.load(fp)
+    inv_machine = {v:k for k,v in machine.items()}
+    
+    return X, Y, human, machine, inv_machine
+
+def preprocess_data(dataset, human_vocab, machine_vocab, Tx, Ty, one_hot=True):
+    """
+    Encodes a dataset of (human readable, machine readable) pairs into index arrays and, unless one_hot is
+    False (e.g. for a model with an Embedding input), into one-hot arrays
+
+    Returns:
+    X -- int array of shape (m, Tx)
+    Y -- int array of shape (m, Ty)
+    Xoh -- float32 array of shape (m, Tx, len(human_vocab)), or None
+    Yoh -- float32 array of shape (m, Ty, len(machine_vocab)), or None
+    """
     
     X, Y = zip(*dataset)
     
-    X = np.array([string_to_int(i, Tx, human_vocab) for i in X])
-    Y = [string_to_int(t, Ty, machine_vocab) for t in Y]
+    X = encode_strings(X, Tx, human_vocab)
+    Y = encode_strings(Y, Ty, machine_vocab)
     
-    Xoh = np.array(list(map(lambda x: to_categorical(x, num_classes=len(human_vocab)), X)))
-    Yoh = np.array(list(map(lambda x: to_categorical(x, num_classes=len(machine_vocab)), Y)))
+    if not one_hot:
+        return X, Y, None, None
+
+    Xoh = to_one_hot(X, len(human_vocab))
+    Yoh = to_one_hot(Y, len(machine_vocab))
 
-    return X, np.array(Y), Xoh, Yoh
+    return X, Y, Xoh, Yoh
 
 def string_to_int(string, length, vocab):
     """
@@ -206,6 +522,39 @@ def run_examples(model, input_vocabulary, inv_output_vocabulary, examples=EXAMPL
     return predicted
 
 
+def parse_dates(model, strings, human_vocab, inv_machine_vocab, Tx=30, n_s=128, batch_size=1024):
+    """
+    Parses a list of human readable dates with one batched predict per batch_size strings, instead of
+    one predict per string
+
+    Arguments:
+    model -- Keras model instance taking [X, s0, c0], as built by model() in DateParser.py (one-hot or index input)
+    strings -- list of human readable date strings, e.g. ['3 may 1979', 'wed 10 jul 2007']
+    human_vocab -- vocabulary, dictionary used to index every character of the input strings
+    inv_machine_vocab -- dictionary mapping machine readable indexes to machine readable characters
+    Tx -- length of the input sequence
+    n_s -- hidden state size of the post-attention LSTM
+    batch_size -- number of strings encoded and passed to the model at once
+
+    Returns:
+    dates -- list of machine readable dates (YYYY-MM-DD), one per input string
+    """
+
+    strings = list(strings)
+    X = encode_strings(strings, Tx, human_vocab)
+    # models built with an Embedding input take the (m, Tx) indices as they are
+    one_hot = len(K.int_shape(model.inputs[0])) == 3
+    dates = []
+    for start in range(0, len(strings), batch_size):
+        batch = X[start:start + batch_size]
+        source = to_one_hot(batch, len(human_vocab)) if one_hot else batch
+        s0 = np.zeros((len(batch), n_s))
+        c0 = np.zeros((len(batch), n_s))
+        prediction = model.predict_on_batch([source, s0, c0])
+        dates.extend(decode_predictions(prediction, inv_machine_vocab))
+    return dates
+
+
 def softmax(x, axis=1):
     """Softmax activation function.
     # Arguments
@@ -227,6 +576,93 @@ def softmax(x, axis=1):
         raise ValueError('Cannot apply softmax to a tensor that is 1D')
         
 
+class SplitDense(Layer):
+    """
+    The Dense(units) layer applied to concat([a, s_prev]) in one_step_attention, split in the encoder and decoder
+    halves of its kernel: called on the Bi-LSTM output a (rank 3) it returns a W_a + b, called on the decoder
+    state s_prev (rank 2) it returns s_prev W_s. a W_a + b only depends on the input sequence, so it is computed
+    once instead of at every one of the Ty decoder steps; the caller adds the two halves and applies the
+    activation. The weights (kernel of shape (encoder_dim + decoder_dim, units), bias) are those of the Dense
+    layer, so weights saved from the concatenating model load as they are.
+    """
+
+    def __init__(self, units, encoder_dim, decoder_dim, **kwargs):
+        """
+        Arguments:
+        units -- number of output units
+        encoder_dim -- last dimension of a (2*n_a)
+        decoder_dim -- last dimension of s_prev (n_s)
+        """
+        super(SplitDense, self).__init__(**kwargs)
+        self.units = units
+        self.encoder_dim = encoder_dim
+        self.decoder_dim = decoder_dim
+
+    def build(self, input_shape):
+        self.kernel = self.add_weight(name='kernel', shape=(self.encoder_dim + self.decoder_dim, self.units),
+                                      initializer='glorot_uniform')
+        self.bias = self.add_weight(name='bias', shape=(self.units,), initializer='zeros')
+        super(SplitDense, self).build(input_shape)
+
+    def call(self, inputs):
+        if K.ndim(inputs) == 3:
+            return K.bias_add(K.dot(inputs, self.kernel[:self.encoder_dim]), self.bias)
+        return K.dot(inputs, self.kernel[self.encoder_dim:])
+
+    def compute_output_shape(self, input_shape):
+        return tuple(input_shape[:-1]) + (self.units,)
+
+    def get_config(self):
+        config = {'units': self.units, 'encoder_dim': self.encoder_dim, 'decoder_dim': self.decoder_dim}
+        base_config = super(SplitDense, self).get_config()
+        return dict(list(base_config.items()) + list(config.items()))
+        
+
+class ThroughputLogger(Callback):
+    """
+    Keras callback appending one JSON line per epoch to "path" with the epoch's wall time, samples/sec, the time
+    spent inside train steps (compute) vs between them (data preparation, e.g. waiting on a DateSequence queue),
+    the process' peak RSS and the logged metrics. Keyword arguments (batch size, n_a, n_s, input path...) are
+    written into every line so that runs with different settings can be compared.
+    """
+
+    def __init__(self, path='training_stats.jsonl', **tags):
+        super(ThroughputLogger, self).__init__()
+        self.path = path
+        self.tags = tags
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = self.batch_end = time.time()
+        self.compute_time = 0.
+        self.data_time = 0.
+        self.samples = 0
+
+    def on_batch_begin(self, batch, logs=None):
+        self.batch_start = time.time()
+        self.data_time += self.batch_start - self.batch_end
+
+    def on_batch_end(self, batch, logs=None):
+        self.batch_end = time.time()
+        self.compute_time += self.batch_end - self.batch_start
+        # keras 2 logs the size of every batch, otherwise fall back on the batch_size tag
+        self.samples += (logs or {}).get('size', self.tags.get('batch_size', 0))
+
+    def on_epoch_end(self, epoch, logs=None):
+        wall_time = time.time() - self.epoch_start
+        record = dict(self.tags)
+        record.update({'epoch': epoch,
+                       'wall_time': wall_time,
+                       'samples': self.samples,
+                       'samples_per_sec': self.samples / wall_time if wall_time else None,
+                       'compute_time': self.compute_time,
+                       'data_time': self.data_time,
+                       # ru_maxrss is in kilobytes on Linux
+                       'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024. if resource else None})
+        record.update({k: float(v) for k, v in (logs or {}).items()})
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
 def plot_attention_map(model, input_vocabulary, inv_output_vocabulary, text, n_s = 128, num = 6, Tx = 30, Ty = 10):
     """
     Plot the attention map.
@@ -239,8 +675,7 @@ def plot_attention_map(model, input_vocabulary, inv_output_vocabulary, text, n_s
     c0 = np.zeros((1, n_s))
     layer = model.layers[num]
 
-    encoded = np.array(string_to_int(text, Tx, input_vocabulary)).reshape((1, 30))
-    encoded = np.array(list(map(lambda x: to_categorical(x, num_classes=len(input_vocabulary)), encoded)))
+    encoded = to_one_hot(encode_strings([text], Tx, input_vocabulary), len(input_vocabulary))
 
     f = K.function(model.inputs, [layer.get_output_at(t) for t in range(Ty)])
     r = f([encoded, s0, c0])
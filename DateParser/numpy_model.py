@@ -0,0 +1,349 @@
+"""
+Pure NumPy forward pass of the DateParser attention model (Bi-LSTM encoder, attention, post-attention LSTM
+decoder), loaded from the artifact written by export_model.py. Worker processes that only serve predictions
+can use it without importing Keras.
+
+The weights can be held in float16 or int8 (with float32 scales) instead of float32 to shrink the resident
+size of each serving worker; products are still accumulated in float32. Check the accuracy of a quantized model
+against the DateParserTester sweep before serving it:
+
+usage: python numpy_model.py date_parser.npz int8
+"""
+import sys
+import json
+import numpy as np
+from encoding import encode_strings, indices_to_strings
+
+
+def sigmoid(x):
+    return 1. / (1. + np.exp(-x))
+
+
+def hard_sigmoid(x):
+    # keras' piecewise linear approximation of the sigmoid
+    return np.clip(0.2 * x + 0.5, 0., 1.)
+
+
+RECURRENT_ACTIVATIONS = {'sigmoid': sigmoid, 'hard_sigmoid': hard_sigmoid}
+
+
+def lstm_step(z, c, recurrent_activation):
+    """
+    One LSTM step from the pre-activations z = x W + h U + b, with keras' gate order (i, f, c, o)
+
+    Arguments:
+    z -- pre-activations of shape (m, 4 * units)
+    c -- previous cell state of shape (m, units)
+    recurrent_activation -- activation of the gates
+
+    Returns:
+    h -- hidden state of shape (m, units)
+    c -- cell state of shape (m, units)
+    """
+
+    i, f, g, o = np.split(z, 4, axis=-1)
+    c = recurrent_activation(f) * c + recurrent_activation(i) * np.tanh(g)
+    h = recurrent_activation(o) * np.tanh(c)
+    return h, c
+
+
+class QuantizedMatrix(object):
+    """
+    int8 weight matrix with one float32 scale per output column (symmetric quantization). x @ W is computed as
+    (x @ q) * scale: NumPy has no int8 matrix product, so q is widened to float32 for the product only.
+    """
+
+    # makes ndarray @ QuantizedMatrix defer to __rmatmul__ instead of converting the matrix to an array
+    __array_ufunc__ = None
+
+    def __init__(self, q, scale):
+        self.q = q
+        self.scale = scale
+        self.shape = q.shape
+        self.nbytes = q.nbytes + scale.nbytes
+
+    @classmethod
+    def quantize(cls, w):
+        scale = np.abs(w).max(axis=0) / 127.
+        scale[scale == 0] = 1.
+        return cls(np.round(w / scale).astype(np.int8), scale.astype(np.float32))
+
+    def __rmatmul__(self, x):
+        return (x @ self.q.astype(np.float32)) * self.scale
+
+    def dequantize(self):
+        return self.q.astype(np.float32) * self.scale
+
+    def __getitem__(self, index):
+        # a selection of columns (W[:, columns]) stays quantized, rows (the x W == W[x] lookup of one-hot
+        # inputs) are dequantized
+        if isinstance(index, tuple):
+            return QuantizedMatrix(self.q[index], self.scale[index[-1]])
+        return self.q[index] * self.scale
+
+
+def quantize(w, precision):
+    """
+    Arguments:
+    w -- float32 weight matrix
+    precision -- 'float32', 'float16' or 'int8'
+
+    Returns:
+    w -- the matrix stored in the given precision, usable as the right operand of x @ w
+    """
+
+    if precision == 'float32':
+        return w
+    if precision == 'float16':
+        # float32 @ float16 is computed (and returned) in float32
+        return w.astype(np.float16)
+    if precision == 'int8':
+        return QuantizedMatrix.quantize(w)
+    raise ValueError('unknown precision %r' % (precision,))
+
+
+def dequantize(w):
+    """
+    Float32 copy of a matrix returned by quantize (w itself if it is stored in float32). A recurrent kernel is
+    dequantized once before its time loop, instead of being widened again by every product of the loop
+    """
+
+    if isinstance(w, QuantizedMatrix):
+        return w.dequantize()
+    return w.astype(np.float32, copy=False)
+
+
+class NumpyDateParser(object):
+    """
+    NumPy implementation of model() from DateParser.py. The encoder-side half of the attention Dense layer
+    ("densor1") is computed once per sequence instead of once per decoder step.
+    """
+
+    def __init__(self, weights, config, precision='float32'):
+        """
+        Arguments:
+        weights -- dictionary of float32 weight arrays, as written by export_model
+        config -- dictionary with Tx, Ty, n_a, n_s, the vocabularies and the LSTM recurrent activation
+        precision -- storage of the weight matrices, 'float32', 'float16' or 'int8'; biases stay float32
+        """
+        self.config = config
+        self.precision = precision
+        self.Tx = config['Tx']
+        self.Ty = config['Ty']
+        self.n_a = config['n_a']
+        self.n_s = config['n_s']
+        self.human_vocab = config['human_vocab']
+        self.machine_vocab = config['machine_vocab']
+        self.inv_machine_vocab = {int(k): v for k, v in config['inv_machine_vocab'].items()}
+        self.recurrent_activation = RECURRENT_ACTIVATIONS[config['recurrent_activation']]
+
+        # the input projection of a one-hot input is a row lookup (x W == W[x]); an Embedding input is folded
+        # into it once, and so is the bias
+        forward_input = weights['encoder_forward_kernel']
+        backward_input = weights['encoder_backward_kernel']
+        if 'embedding' in weights:
+            forward_input = weights['embedding'] @ forward_input
+            backward_input = weights['embedding'] @ backward_input
+        self.forward_input = quantize(forward_input + weights['encoder_forward_bias'], precision)
+        self.backward_input = quantize(backward_input + weights['encoder_backward_bias'], precision)
+        self.forward_recurrent_kernel = quantize(weights['encoder_forward_recurrent_kernel'], precision)
+        self.backward_recurrent_kernel = quantize(weights['encoder_backward_recurrent_kernel'], precision)
+
+        # densor1 acts on concat([a, s_prev]): split its kernel into the encoder and decoder halves
+        self.attention_encoder_kernel = quantize(weights['attention_kernel'][:2 * self.n_a], precision)
+        self.attention_decoder_kernel = quantize(weights['attention_kernel'][2 * self.n_a:], precision)
+        self.attention_bias = weights['attention_bias']
+        self.energy_kernel = weights['energy_kernel'][:, 0]
+        self.energy_bias = weights['energy_bias'][0]
+
+        self.decoder_kernel = quantize(weights['decoder_kernel'], precision)
+        self.decoder_recurrent_kernel = quantize(weights['decoder_recurrent_kernel'], precision)
+        self.decoder_bias = weights['decoder_bias']
+        self.output_kernel = quantize(weights['output_kernel'], precision)
+        self.output_bias = weights['output_bias']
+
+    @property
+    def nbytes(self):
+        """
+        Size of the weights held by the model, in bytes
+        """
+
+        return sum(w.nbytes for w in vars(self).values() if isinstance(w, (np.ndarray, QuantizedMatrix)))
+
+    @classmethod
+    def load(cls, path, precision='float32'):
+        """
+        Loads an artifact written by export_model.export_model, with its weight matrices stored in the given
+        precision
+        """
+
+        with np.load(path) as data:
+            config = json.loads(str(data['config']))
+            weights = {name: data[name].astype(np.float32) for name in data.files if name != 'config'}
+        return cls(weights, config, precision)
+
+    def _run_lstm(self, inputs, recurrent_kernel, reverse=False):
+        """
+        Runs an encoder LSTM over precomputed input projections of shape (m, Tx, 4 * n_a) from a zero state
+        and returns its hidden states in input order, shape (m, Tx, n_a)
+        """
+
+        m, Tx, _ = inputs.shape
+        recurrent_kernel = dequantize(recurrent_kernel)
+        h = np.zeros((m, self.n_a), dtype=np.float32)
+        c = np.zeros((m, self.n_a), dtype=np.float32)
+        outputs = np.empty((m, Tx, self.n_a), dtype=np.float32)
+        for t in (range(Tx - 1, -1, -1) if reverse else range(Tx)):
+            h, c = lstm_step(inputs[:, t] + h @ recurrent_kernel, c, self.recurrent_activation)
+            outputs[:, t] = h
+        return outputs
+
+    def encode(self, X):
+        """
+        Arguments:
+        X -- int array of human vocabulary indices of shape (m, Tx)
+
+        Returns:
+        a -- hidden states of the Bi-LSTM, shape (m, Tx, 2 * n_a)
+        a_proj -- encoder half of the attention Dense layer applied to a, shape (m, Tx, attention units)
+        """
+
+        a = np.concatenate([self._run_lstm(self.forward_input[X], self.forward_recurrent_kernel),
+                            self._run_lstm(self.backward_input[X], self.backward_recurrent_kernel, reverse=True)],
+                           axis=-1)
+        return a, a @ self.attention_encoder_kernel + self.attention_bias
+
+    def decoder_kernels(self):
+        """
+        Returns:
+        kernels -- dict of the float32 (dequantized) kernels used at every decoder step, computed once per decode
+                   loop and passed to each step
+        """
+
+        return {name: dequantize(getattr(self, name))
+                for name in ('attention_decoder_kernel', 'decoder_kernel', 'decoder_recurrent_kernel', 'output_kernel')}
+
+    def attend(self, a, a_proj, s, kernels=None):
+        """
+        One step of attention (one_step_attention), returns the context vector of shape (m, 2 * n_a)
+        """
+
+        kernels = kernels or self.decoder_kernels()
+        e = np.tanh(a_proj + (s @ kernels['attention_decoder_kernel'])[:, np.newaxis])
+        energies = np.maximum(e @ self.energy_kernel + self.energy_bias, 0.)
+        alphas = np.exp(energies - energies.max(axis=1, keepdims=True))
+        alphas /= alphas.sum(axis=1, keepdims=True)
+        return np.einsum('mt,mtn->mn', alphas, a)
+
+    def decoder_step(self, a, a_proj, s, c, kernels=None):
+        """
+        Attention and post-attention LSTM cell of one decoder step, without the output layer. The decoder is
+        not fed its previous output, so its states only depend on the encoder states a. kernels is the
+        decoder_kernels() of the decode loop (computed here if None).
+
+        Returns:
+        s -- next hidden state of the post-attention LSTM
+        c -- next cell state of the post-attention LSTM
+        """
+
+        kernels = kernels or self.decoder_kernels()
+        context = self.attend(a, a_proj, s, kernels)
+        z = context @ kernels['decoder_kernel'] + s @ kernels['decoder_recurrent_kernel'] + self.decoder_bias
+        return lstm_step(z, c, self.recurrent_activation)
+
+    def step(self, a, a_proj, s, c, kernels=None):
+        """
+        One decoder step: attention, post-attention LSTM cell and output layer (kernels as in decoder_step)
+
+        Returns:
+        logits -- pre-softmax scores over the machine vocabulary, shape (m, machine_vocab_size)
+        s -- next hidden state of the post-attention LSTM
+        c -- next cell state of the post-attention LSTM
+        """
+
+        kernels = kernels or self.decoder_kernels()
+        s, c = self.decoder_step(a, a_proj, s, c, kernels)
+        return s @ kernels['output_kernel'] + self.output_bias, s, c
+
+    def initial_state(self, m):
+        return np.zeros((m, self.n_s), dtype=np.float32), np.zeros((m, self.n_s), dtype=np.float32)
+
+    def predict(self, X):
+        """
+        Arguments:
+        X -- int array of human vocabulary indices of shape (m, Tx)
+
+        Returns:
+        probabilities -- softmax outputs of shape (m, Ty, machine_vocab_size)
+        """
+
+        a, a_proj = self.encode(X)
+        s, c = self.initial_state(len(X))
+        kernels = self.decoder_kernels()
+        logits = []
+        for t in range(self.Ty):
+            out, s, c = self.step(a, a_proj, s, c, kernels)
+            logits.append(out)
+        logits = np.stack(logits, axis=1)
+        probabilities = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        return probabilities / probabilities.sum(axis=-1, keepdims=True)
+
+    def parse(self, strings, batch_size=1024):
+        """
+        Arguments:
+        strings -- list of human readable date strings
+        batch_size -- number of strings run through the network at once
+
+        Returns:
+        dates -- list of machine readable dates (YYYY-MM-DD), one per input string
+        """
+
+        X = encode_strings(list(strings), self.Tx, self.human_vocab)
+        dates = []
+        for start in range(0, len(X), batch_size):
+            indices = np.argmax(self.predict(X[start:start + batch_size]), axis=-1)
+            dates.extend(indices_to_strings(indices, self.inv_machine_vocab))
+        return dates
+
+
+def check_quantization(path, precision='int8', max_accuracy_drop=0.005, **sweep_args):
+    """
+    Accuracy regression check of a quantized model: runs the DateParserTester sweep with the float32 and the
+    quantized weights
+
+    Arguments:
+    path -- artifact written by export_model
+    precision -- 'float16' or 'int8'
+    max_accuracy_drop -- largest accepted loss of sweep accuracy
+    sweep_args -- passed to DateParserTester.evaluate_sweep, e.g. years=range(1950, 2050)
+
+    Returns:
+    report -- dictionary with the accuracy, weight bytes and sweep time of both models, the fraction of
+              predictions that agree and whether the check passed
+    """
+
+    from DateParserTester import evaluate_sweep
+
+    sweep_args.setdefault('baseline', False)
+    report = {}
+    predictions = {}
+    for name in ('float32', precision):
+        model = NumpyDateParser.load(path, name)
+
+        def parse(strings):
+            predictions[name] = model.parse(strings)
+            return predictions[name]
+
+        sweep = evaluate_sweep(None, parse=parse, **sweep_args)
+        report[name] = {'accuracy': sweep['accuracy']['model'], 'nbytes': model.nbytes,
+                        'seconds': sweep['seconds']['model']}
+    report['agreement'] = float(np.mean(np.array(predictions['float32']) == np.array(predictions[precision])))
+    report['accuracy_drop'] = report['float32']['accuracy'] - report[precision]['accuracy']
+    report['passed'] = report['accuracy_drop'] <= max_accuracy_drop
+    return report
+
+
+if __name__ == "__main__":
+    report = check_quantization(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else 'int8')
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report['passed'] else 1)
@@ -0,0 +1,112 @@
+import threading
+from collections import OrderedDict
+
+
+def normalize(string):
+    """
+    Cache key of a date string: the same normalization string_to_int applies before encoding, so strings
+    with the same key always get the same prediction
+    """
+
+    return string.lower().replace(',', '')
+
+
+class LRUCache(object):
+    """
+    Bounded, thread-safe least recently used cache with hit/miss/eviction counters
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value of key, or None on a miss
+        """
+
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+class CachedDateParser(object):
+    """
+    Memoizes a date parsing function: batches are deduplicated on the normalized string and only the unique
+    strings missing from the cache are sent to the model
+    """
+
+    def __init__(self, parse, maxsize=100000):
+        """
+        Arguments:
+        parse -- function mapping a list of date strings to a list of machine readable dates, e.g.
+                 lambda strings: parse_dates(model, strings, human_vocab, inv_machine_vocab) or HybridDateParser.parse
+        maxsize -- maximum number of cached predictions
+        """
+        self._parse = parse
+        self.cache = LRUCache(maxsize)
+        self.deduplicated = 0
+        self._lock = threading.Lock()
+
+    def parse(self, strings):
+        """
+        Arguments:
+        strings -- list of human readable date strings
+
+        Returns:
+        dates -- list of machine readable dates (YYYY-MM-DD), one per input string
+        """
+
+        keys = [normalize(string) for string in strings]
+        unique = list(OrderedDict.fromkeys(keys))
+        with self._lock:
+            self.deduplicated += len(keys) - len(unique)
+
+        dates = {}
+        misses = []
+        for key in unique:
+            value = self.cache.get(key)
+            if value is None:
+                misses.append(key)
+            else:
+                dates[key] = value
+        if misses:
+            for key, value in zip(misses, self._parse(misses)):
+                self.cache.put(key, value)
+                dates[key] = value
+        return [dates[key] for key in keys]
+
+    def parse_date(self, string):
+        return self.parse([string])[0]
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats['deduplicated'] = self.deduplicated
+        return stats
@@ -0,0 +1,113 @@
+import re
+import calendar
+import threading
+from datetime import date
+
+# english month and day names, full and abbreviated, as produced by babel (en_US) and strftime in format_date_x
+MONTHS = {}
+for i in range(1, 13):
+    MONTHS[calendar.month_name[i].lower()] = i
+    MONTHS[calendar.month_abbr[i].lower()] = i
+MONTHS['sept'] = 9
+DAYS = [name.lower() for name in list(calendar.day_name) + list(calendar.day_abbr)]
+
+_MONTH = '(' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + ')'
+_DAY_NAME = '(?:(?:' + '|'.join(sorted(DAYS, key=len, reverse=True)) + r')\s+)?'
+_DAY = r'(\d{1,2})(?:st|nd|rd|th)?'
+_YEAR = r'(\d{4})'
+
+# every pattern is matched against the whole normalized string, two digit years are left to the model since
+# their century is ambiguous
+PATTERNS = [
+    # '5 jan 1979', '05 january 1979', 'mon 3 dec 1900', 'monday 5th of dec 1979'
+    (re.compile('^' + _DAY_NAME + _DAY + r'\s+(?:of\s+)?' + _MONTH + r'\s+' + _YEAR + '$'), ('day', 'month', 'year')),
+    # 'jan 5 1979', 'january 5th 1979', 'friday january 5 1979'
+    (re.compile('^' + _DAY_NAME + _MONTH + r'\s+' + _DAY + r'\s+' + _YEAR + '$'), ('month', 'day', 'year')),
+    # '5-12-2018', '05 12 2018' (day first, like format_date_x). Slash dates are left to the model: the only
+    # slash format of the training data (babel en_US 'short') is month first, so they have no single reading
+    (re.compile(r'^(\d{1,2})([-\s.])(\d{1,2})\2' + _YEAR + '$'), ('day', None, 'month', 'year')),
+]
+
+
+def normalize(string):
+    """
+    Applies the normalization of string_to_int (lower case, no commas) and collapses whitespace
+    """
+
+    return ' '.join(string.lower().replace(',', '').split())
+
+
+def parse_fast(string):
+    """
+    Parses a human readable date with the compiled patterns of the known regular formats
+
+    Arguments:
+    string -- human readable date string, e.g. 'Wed 10 Jul 2007'
+
+    Returns:
+    date -- machine readable date (YYYY-MM-DD), or None if no pattern resolves the string to a valid date
+    """
+
+    string = normalize(string)
+    for pattern, fields in PATTERNS:
+        match = pattern.match(string)
+        if match is None:
+            continue
+        values = dict(zip(fields, match.groups()))
+        month = values['month']
+        month = MONTHS[month] if month in MONTHS else int(month)
+        try:
+            return date(int(values['year']), month, int(values['day'])).isoformat()
+        except ValueError:
+            return None
+    return None
+
+
+class HybridDateParser(object):
+    """
+    Resolves the regular formats with parse_fast and only sends the strings it cannot resolve to the
+    attention model, counting how much traffic takes each path
+    """
+
+    def __init__(self, parse_model):
+        """
+        Arguments:
+        parse_model -- function mapping a list of date strings to a list of machine readable dates, e.g.
+                       lambda strings: parse_dates(model, strings, human_vocab, inv_machine_vocab)
+        """
+        self.parse_model = parse_model
+        self.counts = {'fast_path': 0, 'model': 0}
+        self._lock = threading.Lock()
+
+    def parse(self, strings):
+        """
+        Arguments:
+        strings -- list of human readable date strings
+
+        Returns:
+        dates -- list of machine readable dates (YYYY-MM-DD), one per input string
+        """
+
+        dates = [parse_fast(string) for string in strings]
+        misses = [i for i, dt in enumerate(dates) if dt is None]
+        if misses:
+            for i, dt in zip(misses, self.parse_model([strings[i] for i in misses])):
+                dates[i] = dt
+        with self._lock:
+            self.counts['fast_path'] += len(dates) - len(misses)
+            self.counts['model'] += len(misses)
+        return dates
+
+    def stats(self):
+        """
+        Returns:
+        stats -- dictionary with the number and fraction of strings resolved by each path
+        """
+
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        stats = dict(counts)
+        for path, count in counts.items():
+            stats[path + '_fraction'] = count / total if total else 0.0
+        return stats
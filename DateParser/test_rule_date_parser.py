@@ -0,0 +1,22 @@
+import unittest
+from rule_date_parser import parse_fast, HybridDateParser
+
+
+class ParseFastTest(unittest.TestCase):
+
+    def test_day_first_numeric(self):
+        self.assertEqual(parse_fast('05-12-2018'), '2018-12-05')
+        self.assertEqual(parse_fast('5 12 2018'), '2018-12-05')
+
+    def test_slash_dates_are_not_read_day_first(self):
+        # the only slash format of the training data (babel en_US 'short') is month first
+        self.assertIn(parse_fast('05/12/2018'), (None, '2018-05-12'))
+
+    def test_slash_dates_reach_the_model(self):
+        parser = HybridDateParser(lambda strings: ['model'] * len(strings))
+        result = parser.parse(['05/12/2018'])
+        self.assertIn(result[0], ('model', '2018-05-12'))
+
+
+if __name__ == '__main__':
+    unittest.main()
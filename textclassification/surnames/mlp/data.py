@@ -1,7 +1,11 @@
 import torch
+import numpy as np
 import glob
+import os
+import json
 import unicodedata
 import string
+from torch.utils.data import Dataset, DataLoader, Sampler, WeightedRandomSampler
 
 all_letters = string.ascii_letters + " .,;'-"
 n_letters = len(all_letters)
@@ -25,25 +29,188 @@ def readLines(filename):
 def letterToIndex(letter):
     return all_letters.find(letter)
 
+# Index of every ASCII character in all_letters, n_letters (the padding index) for the characters
+# that are not letters, e.g. letter_table[ord('a')] = 0
+letter_table = torch.full((128,), n_letters, dtype=torch.long)
+letter_table[[ord(letter) for letter in all_letters]] = torch.arange(n_letters)
+
+# Turn a list of lines into a <max_line_length x batch_size> tensor of letter indices, padded with
+# n_letters, and the length of each line. All lines are looked up in letter_table at once.
+def linesToIndices(lines):
+    lengths = torch.tensor([len(line) for line in lines], dtype=torch.long)
+    codes = np.frombuffer(''.join(lines).encode('ascii', 'replace'), dtype=np.uint8)
+    # at least one (padding) step, so that a batch of empty lines still has an output
+    indices = torch.full((len(lines), max([len(line) for line in lines] + [1])), n_letters, dtype=torch.long)
+    mask = torch.arange(indices.size(1)) < lengths.unsqueeze(1)
+    indices[mask] = letter_table[torch.from_numpy(codes.astype(np.int64))]
+    return indices.t(), lengths
+
+# Turn a tensor of letter indices into one-hot letter vectors with a single scatter,
+# the padding index gives an all zero vector
+def indicesToOneHot(indices):
+    tensor = torch.zeros(indices.shape + (n_letters + 1,))
+    tensor.scatter_(-1, indices.unsqueeze(-1), 1)
+    return tensor[..., :n_letters]
+
 # Turn a line into a <line_length x 1 x n_letters>,
 # or an array of one-hot letter vectors
 def lineToTensor(line):
-    tensor = torch.zeros(len(line), 1, n_letters)
-    for li, letter in enumerate(line):
-        tensor[li][0][letterToIndex(letter)] = 1
-    return tensor
+    return indicesToOneHot(linesToIndices([line])[0])
 
-# Build the category_lines dictionary, a list of lines per category
-category_lines = {}
-all_categories = []
-for filename in findFiles('../names_data/names/*.txt'):
-    category = filename.split('/')[-1].split('.')[0]
-    all_categories.append(category)
-    lines = readLines(filename)
-    category_lines[category] = lines
+# Turn a list of lines into a <batch_size x n_letters> tensor of letter counts (the sum of the
+# one-hot letter vectors of each line, the MLP input) with a single scatter_add
+def linesToBags(lines):
+    indices, _ = linesToIndices(lines)
+    tensor = torch.zeros(len(lines), n_letters + 1)
+    tensor.scatter_add_(1, indices.t(), torch.ones(indices.t().shape))
+    return tensor[:, :n_letters]
+
+# The names corpus and its cache, found next to this file whatever the working directory
+names_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'names_data')
+cache_dir = os.path.join(names_dir, 'cache')
+cache_files = ['line_letters.npy', 'line_offsets.npy', 'line_categories.npy', 'meta.json']
+
+# Names, sizes and modification times of the corpus files, and the alphabet:
+# the cache is rebuilt when any of them changes
+def corpusSignature(filenames):
+    return [all_letters] + [[os.path.basename(f), os.path.getsize(f), os.path.getmtime(f)] for f in filenames]
+
+# Normalize the corpus once with unicodeToAscii and write it to cache_dir as flat arrays: the letter
+# indices of all lines concatenated, the offset of each line in them and the category id of each line
+def buildNamesCache():
+    filenames = findFiles(os.path.join(names_dir, 'names', '*.txt'))
+    categories = []
+    lines = []
+    category_ids = []
+    for category_i, filename in enumerate(filenames):
+        categories.append(os.path.splitext(os.path.basename(filename))[0])
+        file_lines = readLines(filename)
+        lines.extend(file_lines)
+        category_ids.extend([category_i] * len(file_lines))
+
+    codes = np.frombuffer(''.join(lines).encode('ascii'), dtype=np.uint8)
+    arrays = [letter_table.numpy().astype(np.uint8)[codes],
+              np.concatenate([[0], np.cumsum([len(line) for line in lines], dtype=np.int64)]),
+              np.array(category_ids, dtype=np.uint8)]
+    meta = {'categories': categories, 'signature': corpusSignature(filenames)}
+
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # write under temporary names and rename, meta.json last, so an interrupted build is never loaded
+        for name, array in zip(cache_files, arrays):
+            path = os.path.join(cache_dir, name)
+            np.save(path + '.tmp.npy', array)
+            os.replace(path + '.tmp.npy', path)
+        path = os.path.join(cache_dir, cache_files[-1])
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        pass  # read-only checkout: use the corpus built in memory
+    return categories, arrays[0], arrays[1], arrays[2]
+
+# Memory-map the cache, raises ValueError if it is out of date with the corpus files
+def loadNamesCache():
+    with open(os.path.join(cache_dir, cache_files[-1])) as f:
+        meta = json.load(f)
+    if meta['signature'] != corpusSignature(findFiles(os.path.join(names_dir, 'names', '*.txt'))):
+        raise ValueError('names cache is out of date')
+    arrays = [np.load(os.path.join(cache_dir, name), mmap_mode='r') for name in cache_files[:-1]]
+    return [meta['categories']] + arrays
+
+try:
+    all_categories, line_letters, line_offsets, line_categories = loadNamesCache()
+except (OSError, ValueError, KeyError):
+    all_categories, line_letters, line_offsets, line_categories = buildNamesCache()
 
 n_categories = len(all_categories)
 
+# Build the category_lines dictionary, a list of lines per category, from the letter indices
+all_lines = np.frombuffer(all_letters.encode('ascii'), dtype=np.uint8)[line_letters].tobytes().decode('ascii')
+offsets = line_offsets.tolist()
+all_lines = [all_lines[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+category_bounds = np.searchsorted(line_categories, np.arange(n_categories + 1)).tolist()
+category_lines = {}
+for category_i, category in enumerate(all_categories):
+    category_lines[category] = all_lines[category_bounds[category_i]:category_bounds[category_i + 1]]
+
+# Category id of every category, instead of a linear all_categories.index(category) scan
+category_ids = {category: category_i for category_i, category in enumerate(all_categories)}
+
+
+class NamesDataset(Dataset):
+    """(line, category id) pairs of the names corpus: the given line numbers, or every non-empty line"""
+
+    def __init__(self, line_numbers=None):
+        lengths = np.diff(line_offsets)
+        self.line_numbers = np.flatnonzero(lengths) if line_numbers is None else np.asarray(line_numbers)
+        self.labels = np.asarray(line_categories)[self.line_numbers].astype(np.int64)
+        self.lengths = lengths[self.line_numbers]
+
+    def __len__(self):
+        return len(self.line_numbers)
+
+    def __getitem__(self, i):
+        return all_lines[self.line_numbers[i]], int(self.labels[i])
+
+
+class StratifiedSampler(Sampler):
+    """A new order of the dataset every epoch, in which every category is spread evenly over the epoch,
+    so that any run of consecutive samples (a batch) holds the categories in about their corpus proportions"""
+
+    def __init__(self, labels, seed=0):
+        self.labels = np.asarray(labels)
+        self.seed = seed
+        self.epoch = 0
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __iter__(self):
+        rng = np.random.RandomState(self.seed + self.epoch)
+        self.epoch += 1
+        order = rng.permutation(len(self.labels))
+        labels = self.labels[order]
+        counts = np.bincount(labels)
+        # rank of every sample among the shuffled samples of its category: the k-th of n samples of a
+        # category goes at (k + u) / n of the epoch, u uniform in [0, 1)
+        by_category = np.argsort(labels, kind='stable')
+        ranks = np.empty(len(labels))
+        ranks[by_category] = np.arange(len(labels)) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = (ranks + rng.uniform(size=len(labels))) / counts[labels]
+        return iter(order[np.argsort(positions)].tolist())
+
+
+# Collate a list of (line, category id) pairs into letter counts and category ids
+def collateBags(batch):
+    category_tensor = torch.tensor([category_i for _, category_i in batch], dtype=torch.long)
+    return linesToBags([line for line, _ in batch]), category_tensor
+
+
+def namesLoader(dataset, batch_size=64, sampling='shuffle', collate_fn=None, num_workers=0, seed=0):
+    """DataLoader over a NamesDataset, reshuffled every epoch
+
+    Args:
+        dataset (NamesDataset): the lines to iterate over
+        batch_size (int): number of lines per batch
+        sampling (str): 'shuffle' (a random permutation), 'stratified' (StratifiedSampler), 'weighted'
+            (categories drawn with equal probability, with replacement, like randomTrainingExample)
+        collate_fn (function): turns a list of (line, category id) pairs into a batch, e.g. collateBags
+        num_workers (int): number of processes encoding the batches
+    """
+    sampler = None
+    if sampling == 'stratified':
+        sampler = StratifiedSampler(dataset.labels, seed)
+    elif sampling == 'weighted':
+        weights = 1. / np.bincount(dataset.labels)[dataset.labels]
+        sampler = WeightedRandomSampler(torch.from_numpy(weights), len(dataset))
+    elif sampling != 'shuffle':
+        raise ValueError('unknown sampling %r' % (sampling,))
+    return DataLoader(dataset, batch_size, shuffle=sampler is None, sampler=sampler, collate_fn=collate_fn,
+                      num_workers=num_workers, persistent_workers=num_workers > 0)
+
+
 import random
 
 def randomChoice(l):
@@ -53,7 +220,7 @@ def randomChoice(l):
 def randomTrainingExample():
     category = randomChoice(all_categories)
     line = randomChoice(category_lines[category])
-    category_tensor = torch.tensor([all_categories.index(category)], dtype=torch.long)
+    category_tensor = torch.tensor([category_ids[category]], dtype=torch.long)
     line_tensor = lineToTensor(line)
     return category, line, category_tensor, line_tensor
 
@@ -61,4 +228,9 @@ def randomTrainingExample():
 def test():
     for i in range(10):
         category, line, category_tensor, line_tensor = randomTrainingExample()
-        print('category =', category, '/ line =', line)
\ No newline at end of file
+        print('category =', category, '/ line =', line)
+
+
+# python data.py rebuilds the names cache, e.g. before deploying a read-only copy
+if __name__ == "__main__":
+    buildNamesCache()
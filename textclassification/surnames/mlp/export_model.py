@@ -0,0 +1,64 @@
+import sys
+import json
+import time
+import random
+import torch
+from data import *
+from mlp_model import *
+from model_registry import loadCheckpoint
+from exported_model import saveExported, ExportedClassifier
+
+# python export_model.py [path] compiles the trained MLP (model_path) into a TorchScript artifact that
+# ExportedClassifier serves without this code, checks it and benchmarks it against the eager model
+exported_path = sys.argv[1] if len(sys.argv) > 1 else model_path.replace('.pt', '.ts.pt')
+
+mlp, categories = loadCheckpoint(MultilayerPerceptron, model_path)
+saveExported(FusedMultilayerPerceptron(mlp), categories, all_letters, exported_path)
+exported = ExportedClassifier(exported_path)
+
+
+# Eager inference of one name as mlp_predict does it: the MLP on the summed one-hot letter vectors
+def eagerPredict(name):
+    with torch.no_grad():
+        return mlp(lineToTensor(name).sum(0)).topk(3, 1, True)
+
+
+# Median and 99th percentile of the latency of predicting one name at a time, in milliseconds
+def latency(predict, names):
+    # warm up: TorchScript optimizes the graph over its first calls
+    for name in names[:20]:
+        predict(name)
+    times = []
+    for name in names:
+        start = time.perf_counter()
+        predict(name)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {'p50_ms': times[len(times) // 2] * 1000, 'p99_ms': times[int(len(times) * 0.99)] * 1000}
+
+
+# Names per second of scoring the whole corpus in batches of batch_size
+def throughput(score, names, batch_size=4096):
+    with torch.no_grad():
+        for _ in range(2):
+            score(names[:batch_size])
+    start = time.perf_counter()
+    with torch.no_grad():
+        for i in range(0, len(names), batch_size):
+            score(names[i:i + batch_size])
+    return len(names) / (time.perf_counter() - start)
+
+
+names = [line for line in all_lines if line]
+with torch.no_grad():
+    max_difference = (mlp(linesToBags(names)) - exported.module(*linesToIndices(names))).abs().max()
+
+random.seed(0)
+sample = random.sample(names, 1000)
+report = {'path': exported_path,
+          'max_abs_difference': max_difference.item(),
+          'eager': dict(latency(eagerPredict, sample),
+                        batch_names_per_sec=throughput(lambda lines: mlp(linesToBags(lines)), names)),
+          'exported': dict(latency(lambda name: exported.predict([name], 3), sample),
+                           batch_names_per_sec=throughput(lambda lines: exported.module(*linesToIndices(lines)), names))}
+print(json.dumps(report, indent=2))
@@ -1,45 +1,24 @@
+import sys
+import json
 import torch
 from data import *
-from mlp_train import categoryFromOutput
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
+from mlp_model import *
+from evaluation import evaluateLines, plotConfusion
+from model_registry import loadCheckpoint
 
-mlp = torch.load('mlp-classification.pt')
+mlp, _ = loadCheckpoint(MultilayerPerceptron, model_path)
 
-# Keep track of correct guesses in a confusion matrix
-confusion = torch.zeros(n_categories, n_categories)
-n_confusion = 10000
 
-# Just return an output given a line
-def evaluate(line_tensor):
-    output = mlp(line_tensor)
-    return output
+# Scores of a list of names, from their letter counts
+def score(lines):
+    return mlp(linesToBags(lines))
 
-# Go through a bunch of examples and record which are correctly guessed
-for i in range(n_confusion):
-    category, line, category_tensor, line_tensor = randomTrainingExample()
-    output = evaluate(line_tensor)
-    guess, guess_i = categoryFromOutput(output)
-    category_i = all_categories.index(category)
-    confusion[category_i][guess_i] += 1
 
-# Normalize by dividing every row by its sum
-for i in range(n_categories):
-    confusion[i] = confusion[i] / confusion[i].sum()
+# Score every name of the corpus in batches and build the confusion matrix in one pass
+report = evaluateLines(score, all_lines, torch.from_numpy(line_categories.astype(np.int64)), all_categories)
+print(json.dumps({key: value for key, value in report.items() if key != 'confusion'}, indent=2))
 
-# Set up plot
-fig = plt.figure()
-ax = fig.add_subplot(111)
-cax = ax.matshow(confusion.numpy())
-fig.colorbar(cax)
-
-# Set up axes
-ax.set_xticklabels([''] + all_categories, rotation=90)
-ax.set_yticklabels([''] + all_categories)
-
-# Force label at every tick
-ax.xaxis.set_major_locator(ticker.MultipleLocator(1))
-ax.yaxis.set_major_locator(ticker.MultipleLocator(1))
-
-# sphinx_gallery_thumbnail_number = 2
-plt.show()
\ No newline at end of file
+# python mlp_evaluate.py --plot shows the confusion matrix, --plot confusion.png saves it instead
+if '--plot' in sys.argv:
+    i = sys.argv.index('--plot')
+    plotConfusion(report['confusion'], all_categories, sys.argv[i + 1] if len(sys.argv) > i + 1 else None)
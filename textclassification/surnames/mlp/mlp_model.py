@@ -1,6 +1,11 @@
+import os
+import torch
 from torch import nn, sigmoid
 import torch.nn.functional as F
 
+# checkpoint written by mlp_train.py and served by mlp_predict.py, next to this file
+model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mlp-classification.pt')
+
 
 class MultilayerPerceptron(nn.Module):
     def __init__(self, input_dim, hidden_dim, output_dim):
@@ -11,6 +16,8 @@ class MultilayerPerceptron(nn.Module):
             output_dim (int): the output size of the second Linear layer
         """
         super(MultilayerPerceptron, self).__init__()
+        # constructor arguments, saved with the weights by saveCheckpoint
+        self.config = {'input_dim': input_dim, 'hidden_dim': hidden_dim, 'output_dim': output_dim}
         self.fc1 = nn.Linear(input_dim, hidden_dim)
         self.fc2 = nn.Linear(hidden_dim, output_dim)
         self.softmax = nn.LogSoftmax(dim=1)
@@ -27,4 +34,32 @@ class MultilayerPerceptron(nn.Module):
         hidden = F.relu(self.fc1(x_in))
         output = F.relu(self.fc2(hidden))
         output = self.softmax(output)
-        return output
\ No newline at end of file
+        return output
+
+
+class FusedMultilayerPerceptron(nn.Module):
+    """Inference form of a trained MultilayerPerceptron on letter indices, written to be compiled with
+    torch.jit.script
+
+    The letter counts of the lines are built inside the compiled module with one scatter_add over the
+    padded letter indices (the padding index counts towards a zero row of the first layer).
+    """
+
+    def __init__(self, mlp):
+        super(FusedMultilayerPerceptron, self).__init__()
+        input_weight = mlp.fc1.weight.t()
+        input_weight = torch.cat([input_weight, torch.zeros(1, input_weight.size(1))], 0)
+        self.register_buffer('input_weight', input_weight.detach().contiguous())
+        self.register_buffer('input_bias', mlp.fc1.bias.detach())
+        self.register_buffer('output_weight', mlp.fc2.weight.t().detach().contiguous())
+        self.register_buffer('output_bias', mlp.fc2.bias.detach())
+
+    def forward(self, indices, lengths):
+        # type: (Tensor, Tensor) -> Tensor
+        """Log probabilities of the categories of a batch of padded letter indices (linesToIndices)"""
+        counts = torch.zeros(indices.size(1), self.input_weight.size(0))
+        counts.scatter_add_(1, indices.t(), torch.ones(indices.size(1), indices.size(0)))
+        hidden = F.relu(torch.addmm(self.input_bias, counts, self.input_weight))
+        output = F.relu(torch.addmm(self.output_bias, hidden, self.output_weight))
+        return torch.log_softmax(output, 1)
+
@@ -2,18 +2,21 @@ from mlp_model import *
 from data import *
 import sys
 from torch.autograd import Variable
+from model_registry import ModelRegistry
 
-
-mlp = torch.load('mlp-classification.pt')
+# the model is loaded on first use, once per process, and reloaded when mlp_train.py saves a new version
+registry = ModelRegistry(MultilayerPerceptron, model_path)
 
 
 # Just return an output given a line
 def evaluate(line_tensor):
+    mlp, _ = registry.get()
     output = mlp(line_tensor)
     return output
 
 
 def predict(line, n_predictions=3):
+    _, categories = registry.get()
     output = evaluate(Variable(lineToTensor(line).sum(0)))
 
     # Get top N categories
@@ -21,10 +24,10 @@ def predict(line, n_predictions=3):
     predictions = []
 
     for i in range(n_predictions):
-        value = topv[0][i]
-        category_index = topi[0][i]
-        print('(%.2f) %s' % (value, all_categories[category_index]))
-        predictions.append([value, all_categories[category_index]])
+        value = topv[0][i].item()
+        category_index = topi[0][i].item()
+        print('(%.2f) %s' % (value, categories[category_index]))
+        predictions.append([value, categories[category_index]])
 
     return predictions
 
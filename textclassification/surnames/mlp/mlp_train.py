@@ -1,6 +1,7 @@
 from torch import nn
 from data import *
-from mlp_model import MultilayerPerceptron
+from mlp_model import MultilayerPerceptron, model_path
+from model_registry import saveCheckpoint
 import random
 import time
 import math
@@ -12,6 +13,16 @@ n_epochs = 100000
 print_every = 5000
 plot_every = 1000
 learning_rate = 0.005 # If you set this too high, it might explode. If too low, it might not learn
+# set to e.g. 64 to train on batches of names (one optimizer step per batch) for n_batch_epochs passes over
+# the whole corpus, instead of on n_epochs random names one at a time
+batch_size = None
+n_batch_epochs = 20
+batch_learning_rate = 0.1
+# order of the names in each epoch: 'shuffle', 'stratified' (every batch in about the corpus proportions)
+# or 'weighted' (balanced categories)
+sampling = 'shuffle'
+# number of DataLoader processes encoding the batches
+num_workers = 0
 
 def categoryFromOutput(output):
     top_n, top_i = output.data.topk(1) # Tensor out of Variable with .data
@@ -24,13 +35,13 @@ def randomChoice(l):
 def randomTrainingPair():
     category = randomChoice(all_categories)
     line = randomChoice(category_lines[category])
-    category_tensor = Variable(torch.LongTensor([all_categories.index(category)]))
+    category_tensor = Variable(torch.LongTensor([category_ids[category]]))
     line_tensor = Variable(lineToTensor(line))
     return category, line, category_tensor, line_tensor
 
 
 mlp = MultilayerPerceptron(input_dim=n_letters, hidden_dim=100, output_dim=n_categories)
-optimizer = torch.optim.SGD(mlp.parameters(), lr=learning_rate)
+optimizer = torch.optim.SGD(mlp.parameters(), lr=learning_rate if batch_size is None else batch_learning_rate)
 criterion = nn.NLLLoss()
 
 
@@ -65,25 +76,38 @@ def timeSince(since):
 
 start = time.time()
 
-for epoch in range(1, n_epochs + 1):
-    category, line, category_tensor, line_tensor = randomTrainingPair()
-    tensor_1d = line_tensor.sum(0)
-    output, loss = train(category_tensor, tensor_1d)
-    current_loss += loss
-
-    # Print epoch number, loss, name and guess
-    if epoch % print_every == 0:
-        guess, guess_i = categoryFromOutput(output)
-        correct = '✓' if guess == category else '✗ (%s)' % category
-        print('%d %d%% (%s) %.4f %s / %s %s' % (epoch, epoch / n_epochs * 100, timeSince(start), loss, line, guess, correct))
-
-    # Add current loss avg to list of losses
-    if epoch % plot_every == 0:
-        all_losses.append(current_loss / plot_every)
-        current_loss = 0
-
-
-torch.save(mlp, 'mlp-classification.pt')
+if batch_size is not None:
+    dataset = NamesDataset()
+    loader = namesLoader(dataset, batch_size, sampling, collateBags, num_workers)
+    for epoch in range(1, n_batch_epochs + 1):
+        epoch_start = time.time()
+        epoch_loss = 0
+        for bags, category_tensor in loader:
+            output, loss = train(category_tensor, bags)
+            epoch_loss += loss
+        all_losses.append(epoch_loss / len(loader))
+        print('epoch %d (%s) %.4f %d names/s' % (epoch, timeSince(start), all_losses[-1],
+                                                 len(dataset) / (time.time() - epoch_start)))
+else:
+    for epoch in range(1, n_epochs + 1):
+        category, line, category_tensor, line_tensor = randomTrainingPair()
+        tensor_1d = line_tensor.sum(0)
+        output, loss = train(category_tensor, tensor_1d)
+        current_loss += loss
+
+        # Print epoch number, loss, name and guess
+        if epoch % print_every == 0:
+            guess, guess_i = categoryFromOutput(output)
+            correct = '✓' if guess == category else '✗ (%s)' % category
+            print('%d %d%% (%s) %.4f %s / %s %s' % (epoch, epoch / n_epochs * 100, timeSince(start), loss, line, guess, correct))
+
+        # Add current loss avg to list of losses
+        if epoch % plot_every == 0:
+            all_losses.append(current_loss / plot_every)
+            current_loss = 0
+
+
+saveCheckpoint(mlp, all_categories, model_path)
 
 print(all_losses)
 plt.figure()
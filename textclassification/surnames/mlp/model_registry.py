@@ -0,0 +1,93 @@
+import os
+import time
+import threading
+import torch
+
+
+def saveCheckpoint(model, categories, path):
+    """Saves the state_dict of a model with the arguments it was built with and its categories
+
+    The file is written under a temporary name and renamed, so a ModelRegistry watching path never loads
+    a partially written checkpoint.
+
+    Args:
+        model (nn.Module): a model with a config dict of its constructor arguments
+        categories (list): category of every model output, in order
+        path (str): file to write the checkpoint to
+    """
+    torch.save({'config': model.config, 'state_dict': model.state_dict(), 'categories': list(categories)},
+               path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def loadCheckpoint(model_class, path):
+    """Builds a model from a checkpoint written by saveCheckpoint, ready for inference
+
+    Returns:
+        the model in eval mode without gradients, and its categories
+    """
+    checkpoint = torch.load(path, map_location='cpu')
+    model = model_class(**checkpoint['config'])
+    model.load_state_dict(checkpoint['state_dict'])
+    model.eval()
+    model.requires_grad_(False)
+    return model, checkpoint['categories']
+
+
+class ModelRegistry(object):
+    """Loads a checkpoint once per process and swaps in a new version of the file without a restart
+
+    get() checks the modification time of the checkpoint at most every check_interval seconds. A new
+    version is loaded completely before it replaces the current one, so requests in flight finish on the
+    model they started with.
+
+    Loading the model before forking worker processes (get() in the parent) lets the workers share the
+    weights copy-on-write: the tensors are only read, so their pages are never copied. A worker that later
+    picks up a new version loads its own copy.
+    """
+
+    def __init__(self, model_class, path, check_interval=5.0, load=None):
+        """
+        Args:
+            model_class (type): class the checkpoint is built with, e.g. RNN
+            path (str): checkpoint written by saveCheckpoint
+            check_interval (float): seconds between checks for a new version, None to never check
+            load (function): loads path instead of loadCheckpoint(model_class, path), e.g. ExportedClassifier
+        """
+        self.model_class = model_class
+        self.load = load or (lambda path: loadCheckpoint(self.model_class, path))
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self.loaded_at = None
+        self._loaded = None
+        self._mtime = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Returns the current (model, categories) (or what load returns), loading the checkpoint on first use"""
+        now = time.time()
+        if self._loaded is None or (self.check_interval is not None and now - self._checked >= self.check_interval):
+            self._checked = now
+            self.reload()
+        return self._loaded
+
+    def reload(self, force=False):
+        """Loads the checkpoint if it changed since it was last loaded (or if force)
+
+        Returns:
+            True if a new version was loaded
+        """
+        with self._lock:
+            mtime = os.path.getmtime(self.path)
+            if not force and self._loaded is not None and mtime == self._mtime:
+                return False
+            loaded = self.load(self.path)
+            self._loaded, self._mtime = loaded, mtime
+            self.version += 1
+            self.loaded_at = time.time()
+            return True
+
+    def stats(self):
+        return {'path': self.path, 'version': self.version, 'loaded_at': self.loaded_at, 'pid': os.getpid()}
@@ -0,0 +1,100 @@
+import time
+import torch
+
+
+def confusionMatrix(targets, guesses, n_categories):
+    """Counts of (category, guess) pairs with a single bincount
+
+    Args:
+        targets (torch.Tensor): category index of every example
+        guesses (torch.Tensor): guessed category index of every example
+        n_categories (int): number of categories
+    Returns:
+        a (n_categories, n_categories) tensor, confusion[category_i][guess_i] examples of category_i
+        were guessed as guess_i
+    """
+    pairs = targets.long() * n_categories + guesses.long()
+    return torch.bincount(pairs, minlength=n_categories * n_categories).view(n_categories, n_categories)
+
+
+def classMetrics(confusion, all_categories):
+    """Per category precision, recall and F1 of a confusion matrix
+
+    Returns:
+        a dict mapping every category to its precision, recall, f1 and support (number of examples)
+    """
+    confusion = confusion.double()
+    true_positives = confusion.diag()
+    support = confusion.sum(1)
+    precision = true_positives / confusion.sum(0).clamp(min=1)
+    recall = true_positives / support.clamp(min=1)
+    f1 = 2 * precision * recall / (precision + recall).clamp(min=1e-12)
+    return {category: {'precision': precision[i].item(), 'recall': recall[i].item(), 'f1': f1[i].item(),
+                       'support': int(support[i].item())}
+            for i, category in enumerate(all_categories)}
+
+
+def evaluateLines(score, lines, targets, all_categories, batch_size=4096):
+    """Scores every line in batches and reports accuracy, per category metrics and throughput
+
+    Args:
+        score (function): maps a list of lines to a (len(lines), n_categories) tensor of scores,
+            e.g. lambda lines: rnn.forwardBatch(*encodeLines(rnn, lines))
+        lines (list): names to classify
+        targets (torch.Tensor): category index of every line
+        all_categories (list): category names
+        batch_size (int): number of lines scored at once
+    Returns:
+        a dict with the number of lines, seconds, names per second, accuracy, per category metrics
+        and the confusion matrix (as lists, row = category, column = guess)
+    """
+    start = time.time()
+    guesses = []
+    with torch.no_grad():
+        for i in range(0, len(lines), batch_size):
+            guesses.append(score(lines[i:i + batch_size]).argmax(1))
+    guesses = torch.cat(guesses) if guesses else torch.zeros(0, dtype=torch.long)
+    seconds = time.time() - start
+
+    confusion = confusionMatrix(targets, guesses, len(all_categories))
+    return {'n': len(lines),
+            'seconds': seconds,
+            'names_per_sec': len(lines) / seconds if seconds else 0.0,
+            'accuracy': confusion.diag().sum().item() / max(len(lines), 1),
+            'categories': classMetrics(confusion, all_categories),
+            'confusion': confusion.tolist()}
+
+
+def plotConfusion(confusion, all_categories, path=None):
+    """Plots the row normalized confusion matrix, shown or saved to path
+
+    matplotlib is only imported here, so that evaluating does not need it (or a display)
+    """
+    import matplotlib
+    if path is not None:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as ticker
+
+    # Normalize by dividing every row by its sum
+    confusion = torch.tensor(confusion, dtype=torch.float)
+    confusion = confusion / confusion.sum(1, keepdim=True).clamp(min=1)
+
+    # Set up plot
+    fig = plt.figure()
+    ax = fig.add_subplot(111)
+    cax = ax.matshow(confusion.numpy())
+    fig.colorbar(cax)
+
+    # Set up axes
+    ax.set_xticklabels([''] + all_categories, rotation=90)
+    ax.set_yticklabels([''] + all_categories)
+
+    # Force label at every tick
+    ax.xaxis.set_major_locator(ticker.MultipleLocator(1))
+    ax.yaxis.set_major_locator(ticker.MultipleLocator(1))
+
+    if path is None:
+        plt.show()
+    else:
+        fig.savefig(path, bbox_inches='tight')
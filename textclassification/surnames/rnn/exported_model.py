@@ -0,0 +1,63 @@
+import json
+import unicodedata
+import numpy as np
+import torch
+
+
+# Turn a Unicode string to plain ASCII, like the training corpus (see data.unicodeToAscii)
+def unicodeToAscii(s, all_letters):
+    return ''.join(
+        c for c in unicodedata.normalize('NFD', s)
+        if unicodedata.category(c) != 'Mn'
+        and c in all_letters
+    )
+
+
+def saveExported(module, categories, all_letters, path):
+    """Compiles a fused model (FusedRNN, FusedMultilayerPerceptron) with TorchScript and saves it with
+    the category names and the alphabet, everything ExportedClassifier needs to serve it"""
+    meta = json.dumps({'categories': list(categories), 'all_letters': all_letters})
+    torch.jit.save(torch.jit.script(module.eval()), path, _extra_files={'meta.json': meta})
+
+
+class ExportedClassifier(object):
+    """Serves a model saved by saveExported: only needs torch, not the data or model modules (nor the
+    names corpus) of the training code"""
+
+    def __init__(self, path):
+        extra_files = {'meta.json': ''}
+        self.module = torch.jit.load(path, map_location='cpu', _extra_files=extra_files)
+        meta = json.loads(extra_files['meta.json'])
+        self.categories = meta['categories']
+        self.all_letters = meta['all_letters']
+        n_letters = len(self.all_letters)
+        # index of every ASCII character in all_letters, n_letters (the padding index) for the others
+        self.letter_table = torch.full((128,), n_letters, dtype=torch.long)
+        self.letter_table[[ord(letter) for letter in self.all_letters]] = torch.arange(n_letters)
+
+    def encode(self, lines):
+        """<max_line_length x batch_size> letter indices padded with n_letters and the line lengths, as
+        data.linesToIndices"""
+        lengths = torch.tensor([len(line) for line in lines], dtype=torch.long)
+        codes = np.frombuffer(''.join(lines).encode('ascii', 'replace'), dtype=np.uint8)
+        indices = torch.full((len(lines), max([len(line) for line in lines] + [1])), len(self.all_letters),
+                             dtype=torch.long)
+        mask = torch.arange(indices.size(1)) < lengths.unsqueeze(1)
+        indices[mask] = self.letter_table[torch.from_numpy(codes.astype(np.int64))]
+        return indices.t(), lengths
+
+    def predict(self, lines, n_predictions=3, batch_size=4096):
+        """Top n_predictions categories of every line
+
+        Returns:
+            a list of [[log probability, category], ...] per line, best first
+        """
+        lines = [unicodeToAscii(line, self.all_letters) for line in lines]
+        n_predictions = min(n_predictions, len(self.categories))
+        predictions = []
+        with torch.no_grad():
+            for start in range(0, len(lines), batch_size):
+                topv, topi = self.module(*self.encode(lines[start:start + batch_size])).topk(n_predictions, 1, True)
+                for values, indices in zip(topv.tolist(), topi.tolist()):
+                    predictions.append([[value, self.categories[index]] for value, index in zip(values, indices)])
+        return predictions
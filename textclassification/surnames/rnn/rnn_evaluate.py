@@ -1,41 +1,24 @@
-# Keep track of correct guesses in a confusion matrix
-confusion = torch.zeros(n_categories, n_categories)
-n_confusion = 10000
+import sys
+import json
+import torch
+from data import *
+from rnn_model import *
+from evaluation import evaluateLines, plotConfusion
+from model_registry import loadCheckpoint
 
-# Just return an output given a line
-def evaluate(line_tensor):
-    hidden = rnn.initHidden()
+rnn, _ = loadCheckpoint(RNN, model_path)
 
-    for i in range(line_tensor.size()[0]):
-        output, hidden = rnn(line_tensor[i], hidden)
 
-    return output
+# Scores of a list of names, one padded batch through the RNN
+def score(lines):
+    return rnn.forwardBatch(*encodeLines(rnn, lines))
 
-# Go through a bunch of examples and record which are correctly guessed
-for i in range(n_confusion):
-    category, line, category_tensor, line_tensor = randomTrainingExample()
-    output = evaluate(line_tensor)
-    guess, guess_i = categoryFromOutput(output)
-    category_i = all_categories.index(category)
-    confusion[category_i][guess_i] += 1
 
-# Normalize by dividing every row by its sum
-for i in range(n_categories):
-    confusion[i] = confusion[i] / confusion[i].sum()
+# Score every name of the corpus in batches and build the confusion matrix in one pass
+report = evaluateLines(score, all_lines, torch.from_numpy(line_categories.astype(np.int64)), all_categories)
+print(json.dumps({key: value for key, value in report.items() if key != 'confusion'}, indent=2))
 
-# Set up plot
-fig = plt.figure()
-ax = fig.add_subplot(111)
-cax = ax.matshow(confusion.numpy())
-fig.colorbar(cax)
-
-# Set up axes
-ax.set_xticklabels([''] + all_categories, rotation=90)
-ax.set_yticklabels([''] + all_categories)
-
-# Force label at every tick
-ax.xaxis.set_major_locator(ticker.MultipleLocator(1))
-ax.yaxis.set_major_locator(ticker.MultipleLocator(1))
-
-# sphinx_gallery_thumbnail_number = 2
-plt.show()
\ No newline at end of file
+# python rnn_evaluate.py --plot shows the confusion matrix, --plot confusion.png saves it instead
+if '--plot' in sys.argv:
+    i = sys.argv.index('--plot')
+    plotConfusion(report['confusion'], all_categories, sys.argv[i + 1] if len(sys.argv) > i + 1 else None)
@@ -1,24 +1,98 @@
+import os
 import torch
 import torch.nn as nn
 from torch.autograd import Variable
 
+# checkpoint written by rnn_train.py and served by rnn_predict.py, next to this file
+model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'char-rnn-classification.pt')
+
 
 class RNN(nn.Module):
-    def __init__(self, input_size, hidden_size, output_size):
+    def __init__(self, input_size, hidden_size, output_size, embedding_dim=None):
         super(RNN, self).__init__()
 
         self.hidden_size = hidden_size
+        # constructor arguments, saved with the weights by saveCheckpoint
+        self.config = {'input_size': input_size, 'hidden_size': hidden_size, 'output_size': output_size,
+                       'embedding_dim': embedding_dim}
+
+        if embedding_dim is not None:
+            # the input is letter indices (linesToIndices), input_size being the padding index
+            self.embedding = nn.Embedding(input_size + 1, embedding_dim, padding_idx=input_size)
+            input_size = embedding_dim
 
         self.i2h = nn.Linear(input_size + hidden_size, hidden_size)
         self.i2o = nn.Linear(input_size + hidden_size, output_size)
         self.softmax = nn.LogSoftmax()
 
     def forward(self, input, hidden):
+        if input.dtype == torch.long:
+            input = self.embedding(input)
         combined = torch.cat((input, hidden), 1)
         hidden = self.i2h(combined)
         output = self.i2o(combined)
         output = self.softmax(output)
         return output, hidden
 
-    def initHidden(self):
-        return Variable(torch.zeros(1, self.hidden_size))
+    def initHidden(self, batch_size=1):
+        return Variable(torch.zeros(batch_size, self.hidden_size))
+
+    def forwardBatch(self, lines_tensor, lengths):
+        """Runs the cell over a batch of padded lines, one step per character position
+
+        Args:
+            lines_tensor (torch.Tensor): padded lines of shape (max_length, batch, input_size), or letter
+                indices of shape (max_length, batch) for a model with an embedding
+            lengths (torch.Tensor): length of each line, shape (batch,)
+        Returns:
+            the output at the last character of each line, shape (batch, output_size)
+        """
+        hidden = self.initHidden(lines_tensor.size(1))
+        output = None
+        for i in range(lines_tensor.size(0)):
+            step_output, step_hidden = self(lines_tensor[i], hidden)
+            # lines shorter than i + 1 keep the hidden state and output of their last character
+            active = (lengths > i).unsqueeze(1)
+            hidden = torch.where(active, step_hidden, hidden)
+            output = step_output if output is None else torch.where(active, step_output, output)
+        return output
+
+
+class FusedRNN(nn.Module):
+    """Inference form of a trained RNN, written to be compiled with torch.jit.script
+
+    i2h and i2o act on the same concatenation of input and hidden state, so their weights are stacked into
+    one (input_size + hidden_size, hidden_size + output_size) matrix and split by rows instead: the input
+    rows of a letter are a lookup (folded with the embedding, if any, and the biases), gathered for all the
+    characters at once, and every step is a single matmul of the hidden state, without torch.cat.
+    """
+
+    def __init__(self, rnn):
+        super(FusedRNN, self).__init__()
+        self.hidden_size = rnn.hidden_size
+        weight = torch.cat([rnn.i2h.weight, rnn.i2o.weight], 0).t()
+        bias = torch.cat([rnn.i2h.bias, rnn.i2o.bias], 0)
+        input_size = weight.size(0) - self.hidden_size
+        input_weight = weight[:input_size]
+        if rnn.config['embedding_dim'] is not None:
+            input_weight = rnn.embedding.weight @ input_weight
+        else:
+            # one-hot inputs: the padding index (input_size) is the all zero vector
+            input_weight = torch.cat([input_weight, torch.zeros(1, input_weight.size(1))], 0)
+        self.register_buffer('input_weight', (input_weight + bias).detach().contiguous())
+        self.register_buffer('hidden_weight', weight[input_size:].detach().contiguous())
+
+    def forward(self, indices, lengths):
+        # type: (Tensor, Tensor) -> Tensor
+        """Log probabilities of the categories of a batch of padded letter indices (linesToIndices)"""
+        inputs = self.input_weight[indices]
+        hidden = torch.zeros(indices.size(1), self.hidden_size)
+        output = torch.zeros(indices.size(1), self.input_weight.size(1) - self.hidden_size)
+        for i in range(indices.size(0)):
+            combined = inputs[i] + torch.mm(hidden, self.hidden_weight)
+            # lines shorter than i + 1 keep the hidden state and output of their last character
+            active = (lengths > i).unsqueeze(1)
+            output = torch.where(active, combined[:, self.hidden_size:], output)
+            hidden = torch.where(active, combined[:, :self.hidden_size], hidden)
+        return torch.log_softmax(output, 1)
+
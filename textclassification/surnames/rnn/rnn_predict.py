@@ -1,12 +1,15 @@
 from rnn_model import *
 from data import *
+from model_registry import ModelRegistry
 import sys
 
-rnn = torch.load('char-rnn-classifier.pt')
+# the model is loaded on first use, once per process, and reloaded when rnn_train.py saves a new version
+registry = ModelRegistry(RNN, model_path)
 
 
 # Just return an output given a line
 def evaluate(line_tensor):
+    rnn, _ = registry.get()
     hidden = rnn.initHidden()
 
     for i in range(line_tensor.size()[0]):
@@ -16,21 +19,45 @@ def evaluate(line_tensor):
 
 
 def predict(line, n_predictions=3):
-    output = evaluate(Variable(lineToTensor(line)))
+    rnn, categories = registry.get()
+    output = evaluate(Variable(encodeLines(rnn, [line])[0]))
 
     # Get top N categories
     topv, topi = output.data.topk(n_predictions, 1, True)
     predictions = []
 
     for i in range(n_predictions):
-        value = topv[0][i]
-        category_index = topi[0][i]
-        print('(%.2f) %s' % (value, all_categories[category_index]))
-        predictions.append([value, all_categories[category_index]])
+        value = topv[0][i].item()
+        category_index = topi[0][i].item()
+        print('(%.2f) %s' % (value, categories[category_index]))
+        predictions.append([value, categories[category_index]])
 
     return predictions
 
 
+def predictBatch(lines, n_predictions=3, batch_size=4096):
+    """Top n_predictions categories of every line, without printing
+
+    Args:
+        lines (list): names, normalized with unicodeToAscii like the training corpus
+        n_predictions (int): number of categories returned per line
+        batch_size (int): number of lines encoded as one padded batch and run through the RNN at once
+    Returns:
+        a list of [[log probability, category], ...] per line, best first
+    """
+    rnn, categories = registry.get()
+    lines = [unicodeToAscii(line) for line in lines]
+    n_predictions = min(n_predictions, len(categories))
+    predictions = []
+    with torch.no_grad():
+        for start in range(0, len(lines), batch_size):
+            lines_tensor, lengths = encodeLines(rnn, lines[start:start + batch_size])
+            topv, topi = rnn.forwardBatch(lines_tensor, lengths).topk(n_predictions, 1, True)
+            for values, indices in zip(topv.tolist(), topi.tolist()):
+                predictions.append([[value, categories[index]] for value, index in zip(values, indices)])
+    return predictions
+
+
 if __name__ == '__main__':
 
     predict('Habr')
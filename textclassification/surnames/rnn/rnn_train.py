@@ -1,6 +1,8 @@
 import torch
+from functools import partial
 from data import *
 from rnn_model import *
+from model_registry import saveCheckpoint
 import random
 import time
 import math
@@ -10,6 +12,19 @@ n_epochs = 100000
 print_every = 5000
 plot_every = 1000
 learning_rate = 0.005
+# set to e.g. 64 to train on padded batches of names (one optimizer step per batch) for n_batch_epochs
+# passes over the whole corpus, instead of on n_epochs random names one at a time
+batch_size = None
+n_batch_epochs = 20
+# order of the names in each epoch: 'length' (batches of names of similar length, the least padding),
+# 'shuffle', 'stratified' (every batch in about the corpus proportions) or 'weighted' (balanced categories)
+sampling = 'length'
+# number of DataLoader processes encoding the batches
+num_workers = 0
+batch_learning_rate = 0.1
+max_grad_norm = 1.0
+# set to e.g. 16 to feed the RNN letter indices through an embedding instead of one-hot letter vectors
+embedding_dim = None
 
 
 def categoryFromOutput(output):
@@ -25,13 +40,13 @@ def randomChoice(l):
 def randomTrainingPair():
     category = randomChoice(all_categories)
     line = randomChoice(category_lines[category])
-    category_tensor = Variable(torch.LongTensor([all_categories.index(category)]))
-    line_tensor = Variable(lineToTensor(line))
+    category_tensor = Variable(torch.LongTensor([category_ids[category]]))
+    line_tensor = Variable(encodeLines(rnn, [line])[0])
     return category, line, category_tensor, line_tensor
 
 
-rnn = RNN(n_letters, n_hidden, n_categories)
-optimizer = torch.optim.SGD(rnn.parameters(), lr=learning_rate)
+rnn = RNN(n_letters, n_hidden, n_categories, embedding_dim)
+optimizer = torch.optim.SGD(rnn.parameters(), lr=learning_rate if batch_size is None else batch_learning_rate)
 criterion = nn.NLLLoss()
 
 
@@ -50,6 +65,19 @@ def train(category_tensor, line_tensor):
     return output, loss.item()
 
 
+def trainBatch(category_tensor, lines_tensor, lengths):
+    optimizer.zero_grad()
+    output = rnn.forwardBatch(lines_tensor, lengths)
+    loss = criterion(output, category_tensor)
+    loss.backward()
+    # the hidden state has no squashing nonlinearity, clipping keeps the larger batch steps from diverging
+    nn.utils.clip_grad_norm_(rnn.parameters(), max_grad_norm)
+
+    optimizer.step()
+
+    return output, loss.item()
+
+
 # Keep track of losses for plotting
 current_loss = 0
 all_losses = []
@@ -65,22 +93,36 @@ def timeSince(since):
 
 start = time.time()
 
-for epoch in range(1, n_epochs + 1):
-    category, line, category_tensor, line_tensor = randomTrainingPair()
-    output, loss = train(category_tensor, line_tensor)
-    current_loss += loss
-
-    # Print epoch number, loss, name and guess
-    if epoch % print_every == 0:
-        guess, guess_i = categoryFromOutput(output)
-        correct = '✓' if guess == category else '✗ (%s)' % category
-        print('%d %d%% (%s) %.4f %s / %s %s' % (
-        epoch, epoch / n_epochs * 100, timeSince(start), loss, line, guess, correct))
-
-    # Add current loss avg to list of losses
-    if epoch % plot_every == 0:
-        all_losses.append(current_loss / plot_every)
-        current_loss = 0
+if batch_size is not None:
+    dataset = NamesDataset()
+    loader = namesLoader(dataset, batch_size, sampling, partial(collateLines, one_hot=embedding_dim is None),
+                         num_workers)
+    for epoch in range(1, n_batch_epochs + 1):
+        epoch_start = time.time()
+        epoch_loss = 0
+        for lines_tensor, lengths, category_tensor in loader:
+            output, loss = trainBatch(category_tensor, lines_tensor, lengths)
+            epoch_loss += loss
+        all_losses.append(epoch_loss / len(loader))
+        print('epoch %d (%s) %.4f %d names/s' % (epoch, timeSince(start), all_losses[-1],
+                                                 len(dataset) / (time.time() - epoch_start)))
+else:
+    for epoch in range(1, n_epochs + 1):
+        category, line, category_tensor, line_tensor = randomTrainingPair()
+        output, loss = train(category_tensor, line_tensor)
+        current_loss += loss
+
+        # Print epoch number, loss, name and guess
+        if epoch % print_every == 0:
+            guess, guess_i = categoryFromOutput(output)
+            correct = '✓' if guess == category else '✗ (%s)' % category
+            print('%d %d%% (%s) %.4f %s / %s %s' % (
+            epoch, epoch / n_epochs * 100, timeSince(start), loss, line, guess, correct))
+
+        # Add current loss avg to list of losses
+        if epoch % plot_every == 0:
+            all_losses.append(current_loss / plot_every)
+            current_loss = 0
 
 print(all_losses)
 import matplotlib.pyplot as plt
@@ -89,4 +131,4 @@ import matplotlib.ticker as ticker
 plt.figure()
 plt.plot(all_losses)
 
-torch.save(rnn, 'char-rnn-classification.pt')
+saveCheckpoint(rnn, all_categories, model_path)
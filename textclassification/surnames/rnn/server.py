@@ -1,8 +1,119 @@
-from bottle import route, run
-from rnn_predict import *
+import os
+import gc
+import sys
+import signal
+import argparse
+import torch
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+from bottle import route, request, abort, default_app, BaseRequest
+
+
+class Server(WSGIServer):
+    # connections waiting to be accepted, beyond the default 5 bursts of clients are refused and retry a second later
+    request_queue_size = 128
+
+
+class ThreadingServer(ThreadingMixIn, Server):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+parser = argparse.ArgumentParser(description='Serves surname predictions of the char RNN classifier')
+# python server.py 4 serves from 4 pre-forked processes sharing one listening socket
+parser.add_argument('workers', nargs='?', type=int, default=1)
+# serve a TorchScript model written by export_model.py, without the training code or the names corpus
+parser.add_argument('--exported', metavar='PATH')
+# handle every connection in its own thread instead of one request at a time per worker
+parser.add_argument('--threaded', action='store_true')
+# intra-op threads of torch in every worker, by default the cores divided among the workers so that they do
+# not oversubscribe the cores (lower it when several servers share the machine)
+parser.add_argument('--torch-threads', type=int, default=None)
+parser.add_argument('--port', type=int, default=5533)
+# do not log every request to stderr
+parser.add_argument('--quiet', action='store_true')
+args = parser.parse_args()
+torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+
+if args.exported:
+    from model_registry import ModelRegistry
+    from exported_model import ExportedClassifier
+
+    registry = ModelRegistry(None, args.exported, load=ExportedClassifier)
+
+    def predict(line, n_predictions=3):
+        return registry.get().predict([line], n_predictions)[0]
+
+    def predictBatch(lines, n_predictions=3):
+        return registry.get().predict(lines, n_predictions)
+else:
+    from rnn_predict import registry, predict, predictBatch
+
+# bulk requests of thousands of names are larger than bottle's default 100KB body limit
+BaseRequest.MEMFILE_MAX = 10 * 1024 * 1024
 
 @route('/<input_line>')
 def index(input_line):
     return {'result': predict(input_line, 10)}
 
-run(host='localhost', port=5533)
+# POST {"names": ["Jones", "Satoshi", ...], "n_predictions": 10}
+@route('/predict', method='POST')
+def predict_batch():
+    body = request.json
+    names = body.get('names') if isinstance(body, dict) else None
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        abort(400, 'expected a JSON body {"names": [names], "n_predictions": 10}')
+    n_predictions = body.get('n_predictions', 10)
+    if not isinstance(n_predictions, int) or isinstance(n_predictions, bool) or n_predictions < 1:
+        abort(400, 'n_predictions must be an integer >= 1')
+    return {'result': predictBatch(names, n_predictions)}
+
+# version of the model this worker is serving (it changes when a new checkpoint is picked up) and its threads
+@route('/model')
+def model_version():
+    registry.get()
+    return dict(registry.stats(), torch_threads=torch.get_num_threads(), threaded=args.threaded)
+
+# load the model before forking: the workers share its weights copy-on-write instead of loading a copy each,
+# and freezing the objects loaded so far keeps the garbage collector from writing to (and copying) their pages
+registry.get()
+gc.freeze()
+
+server = make_server('localhost', args.port, default_app(),
+                     server_class=ThreadingServer if args.threaded else Server,
+                     handler_class=QuietHandler if args.quiet else WSGIRequestHandler)
+worker_pids = []
+for _ in range(args.workers - 1):
+    pid = os.fork()
+    if pid == 0:
+        worker_pids = []
+        break
+    worker_pids.append(pid)
+
+
+# the parent passes SIGTERM and SIGINT on to the workers it forked and waits for them before exiting, so that
+# stopping only its pid (as a supervisor does) does not leave orphaned workers serving the port
+def stopWorkers(signum, frame):
+    for pid in worker_pids:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+    for pid in worker_pids:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sys.exit(0)
+
+
+if worker_pids:
+    signal.signal(signal.SIGTERM, stopWorkers)
+    signal.signal(signal.SIGINT, stopWorkers)
+# set in every worker after the fork: threads do not survive a fork, every worker starts its own torch pool
+torch.set_num_threads(torch_threads)
+server.serve_forever()
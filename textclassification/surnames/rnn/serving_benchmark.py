@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import time
+import signal
+import random
+import argparse
+import itertools
+import subprocess
+import urllib.request
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from data import all_lines
+
+# python serving_benchmark.py --workers 1 2 4 --threads 1 2 4 starts server.py once per workers x torch threads
+# setting and reports the latency of single name requests and the names/sec of batch requests, as JSON lines
+parser = argparse.ArgumentParser(description='Benchmarks server.py over workers x torch threads settings')
+parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+parser.add_argument('--threaded', action='store_true', help='serve with server.py --threaded')
+parser.add_argument('--exported', metavar='PATH', help='serve a TorchScript model with server.py --exported')
+parser.add_argument('--concurrency', type=int, default=8, help='client requests in flight')
+parser.add_argument('--requests', type=int, default=2000, help='single name requests per setting')
+parser.add_argument('--batches', type=int, default=50, help='batch requests per setting')
+parser.add_argument('--batch-size', type=int, default=256, help='names per batch request')
+parser.add_argument('--port', type=int, default=5540)
+args = parser.parse_args()
+
+url = 'http://localhost:%d' % args.port
+
+
+def get(path, data=None):
+    headers = {'Content-Type': 'application/json'} if data is not None else {}
+    with urllib.request.urlopen(urllib.request.Request(url + path, data, headers)) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+# Starts server.py in its own process group (pre-forked workers included) and waits until it answers
+def startServer(workers, threads):
+    command = [sys.executable, 'server.py', str(workers), '--torch-threads', str(threads), '--port', str(args.port),
+               '--quiet']
+    if args.threaded:
+        command.append('--threaded')
+    if args.exported:
+        command += ['--exported', args.exported]
+    # rnn_predict.predict prints every prediction
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, start_new_session=True)
+    for _ in range(600):
+        try:
+            get('/model')
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError('server.py exited with %d' % server.returncode)
+            time.sleep(0.1)
+    stopServer(server)
+    raise RuntimeError('server.py did not start')
+
+
+def stopServer(server):
+    os.killpg(server.pid, signal.SIGTERM)
+    server.wait()
+
+
+# Sends every request from concurrency client threads, returns the sorted latencies and the wall time
+def load(send, requests):
+    def timed(request):
+        start = time.perf_counter()
+        send(request)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        # warm up every worker before measuring
+        list(pool.map(send, requests[:args.concurrency * 4]))
+        start = time.perf_counter()
+        times = sorted(pool.map(timed, requests))
+        return times, time.perf_counter() - start
+
+
+def percentiles(times):
+    return {'p50_ms': times[len(times) // 2] * 1000, 'p99_ms': times[int(len(times) * 0.99)] * 1000}
+
+
+random.seed(0)
+names = [line for line in all_lines if line]
+singles = [random.choice(names) for _ in range(args.requests)]
+batches = [json.dumps({'names': random.sample(names, args.batch_size), 'n_predictions': 3}).encode('utf-8')
+           for _ in range(args.batches)]
+
+for workers, threads in itertools.product(args.workers, args.threads):
+    server = startServer(workers, threads)
+    try:
+        single_times, single_seconds = load(lambda name: get('/' + quote(name)), singles)
+        batch_times, batch_seconds = load(lambda body: get('/predict', body), batches)
+    finally:
+        stopServer(server)
+    print(json.dumps({'workers': workers, 'torch_threads': threads, 'threaded': args.threaded,
+                      'concurrency': args.concurrency,
+                      'single': dict(percentiles(single_times), names_per_sec=len(singles) / single_seconds),
+                      'batch': dict(percentiles(batch_times),
+                                    names_per_sec=len(batches) * args.batch_size / batch_seconds)}))